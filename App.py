@@ -1,16 +1,20 @@
-import pygame, sys, time, pickle
+import pygame, sys, time, os, queue, threading
 from settings import *
 from Button import Button
 from NumberInput import NumberInput
+from Board import Board
 from Textbox import Textbox
 from Region import Region
-from gurobipy import *
+from puzzlefile import EXTENSION, loadPuzzle, writePuzzle
+from Solver import Session, availableBackends, defaultBackend
+from Profiler import Profiler
 
 
 class App:
     def __init__(self):
         pygame.init()
         self.window = pygame.display.set_mode((WIDTH, HEIGHT))
+        self.clock = pygame.time.Clock()
         self.running = True         # Program running?
         
         self.length = None          # Grid dimension
@@ -20,14 +24,28 @@ class App:
         self.isGenerated = False    # Is the grid generated?
         self.visualise = False      # Visualise lazy constraints?
         self.overlay = False        # Display puzzle png overlay?
+        self.profile = False        # Profile solves?
+        self.profiler = None        # Profiler of the current solve, if profiling
+        self.backend = defaultBackend()     # Solver backend used by Solve
+        self.session = Session()            # Keeps the solver model between solves of an edited puzzle
+        self.solverThread = None            # Worker thread running the current solve
+        self.solverEvents = queue.Queue()   # Solutions, cuts and results posted by the worker thread
+        self.solveGeneration = 0            # Number of the current solve. Events tagged with an older one are stale
+        self.stopRequested = threading.Event()  # Set to make the solver terminate early
+        self.cutSteps = []                  # (cells, colour) steps of the cut being visualised
+        self.cutStepTime = None             # When the current cut step was shown
         
         self.defaultMessage = "Please input data..."    # Default message to display
         self.tempMessageTime = None     # Keep track of how long temporary message has been displayed for
         
         self.mousePos = None    # Cursor position
         
+        self.fullRedraw = True      # Redraw the whole window next frame, rather than only the widgets that changed
+        self.bordersChanged = True  # Rebuild the cached region borders next frame
+        self.borderLayer = None     # Transparent surface holding the grid lines and region borders
+        
         self.buttons = []       # List of Button objects
-        self.gridInputs = {}    # Dictionary of gridInput objects
+        self.board = Board()    # The grid, with a gridInput view of each cell (see Board.py)
         self.regions = []       # List of Region objects
         
 
@@ -42,6 +60,7 @@ class App:
             self.events()
             self.update()
             self.draw()
+            self.clock.tick(FPS)
         pygame.quit()
         sys.exit()
         
@@ -49,7 +68,7 @@ class App:
     def events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                self.running = False
+                self.closeProgram()
                 
                 
             # User left clicks
@@ -68,17 +87,14 @@ class App:
                 else:
                     self.savedSelectionInput.isSelected = False              
                         
-                for gridInput in self.gridInputs.values():
-                    if gridInput.isHighlighted:
-                        gridInput.isSelected = True
-                    else:
-                        gridInput.isSelected = False
+                self.board.selected = self.board.hovered    # Select the cell under the mouse, if any
                         
                         
             # User right clicks            
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
-                for gridInput in self.gridInputs.values():
-                    if gridInput.isHighlighted and not gridInput.inRegion and not gridInput.isGrouped:
+                gridInput = self.board.hoveredCell()
+                if gridInput:
+                    if not gridInput.inRegion and not gridInput.isGrouped:
                         if len(self.gridInputsSelected) == 0:
                             self.gridInputsSelected.append(gridInput)
                             gridInput.isGrouped = 1
@@ -91,11 +107,9 @@ class App:
                                 gridInput.isSelected = False
                                 
                                 
-                    elif gridInput.isHighlighted and gridInput.inRegion:  # if right clicking a region, highlight it
-                        for region in self.regions:
-                            if gridInput in region.gridInputs:
-                                region.isSelected = 1 - region.isSelected
-                                region.highlightGridInputs()
+                    elif gridInput.inRegion:  # if right clicking a region, highlight it
+                        gridInput.region.isSelected = 1 - gridInput.region.isSelected
+                        gridInput.region.highlightGridInputs()
                                 
 
 
@@ -117,13 +131,14 @@ class App:
                         
                     
                     # Grid input - Input region number if one hasn't already been entered
-                    for gridInput in self.gridInputs.values():
-                        if gridInput.isSelected and not gridInput.isLocked:
-                            gridInput.num = event.text
-                            gridInput.updateFont()
-                            for region in self.regions:
-                                if gridInput in region.gridInputs:
-                                    region.lockGridInputs(event.text)
+                    gridInput = self.board.selectedCell()
+                    if gridInput and not gridInput.isLocked:
+                        self.abandonSolve()
+                        gridInput.num = event.text
+                        gridInput.updateFont()
+                        if gridInput.region:
+                            gridInput.region.lockGridInputs(event.text)
+                        self.clueChanged()
                                     
                                                    
             
@@ -131,25 +146,28 @@ class App:
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_BACKSPACE:   # Backspace for removing inputs
                     if self.lengthInput.isSelected:
+                        self.abandonSolve()
                         self.isGenerated = False
-                        self.gridInputs = {}
+                        self.board = Board()
                         self.regions = []
                         self.lengthInput.num = None
                         self.length = None
                         self.defaultMessage = "Please input data..."
                         self.informationTextbox.text = self.defaultMessage
                         self.informationTextbox.updateFont()
+                        self.redrawBoard()
                     if self.savedSelectionInput.isSelected:
                         self.savedSelectionInput.num = None
                         
 
 
-                    for gridInput in self.gridInputs.values():
-                        if gridInput.isSelected and gridInput.num:
-                            gridInput.num = None
-                            for region in self.regions:
-                                if gridInput in region.gridInputs:
-                                    region.unlockGridInputs()
+                    gridInput = self.board.selectedCell()
+                    if gridInput and gridInput.num:
+                        self.abandonSolve()
+                        gridInput.num = None
+                        if gridInput.region:
+                            gridInput.region.unlockGridInputs()
+                        self.clueChanged()
                             
                 elif event.key == pygame.K_SPACE:    # Space bar for add group shortcut
                     self.addGroup()
@@ -160,6 +178,8 @@ class App:
                     
     
     def update(self):
+        self.drainSolverEvents()
+        
         self.mousePos = pygame.mouse.get_pos()
         for button in self.buttons:
             button.update(self.mousePos)
@@ -167,13 +187,12 @@ class App:
         self.lengthInput.update(self.mousePos)
         self.savedSelectionInput.update(self.mousePos)
         
-        for gridInput in self.gridInputs.values():
-            gridInput.update(self.mousePos)
+        self.board.update(self.mousePos)
             
         # If a temporary message is being shown, revert to the original message after 3 seconds
         if self.tempMessageTime:
             if time.perf_counter() - self.tempMessageTime > 3:
-                self.tempMessageTimer = None
+                self.tempMessageTime = None
                 self.informationTextbox.text = self.defaultMessage
                 self.informationTextbox.colour = BLUE
                 self.informationTextbox.updateFont()
@@ -181,28 +200,44 @@ class App:
 
             
     
+    # Only widgets whose appearance changed are redrawn, and only their rects are sent to the display,
+    # unless something (a new board, a region change, the overlay) calls for a full redraw
     def draw(self):
-        self.window.fill(BACKGROUNDGREY)
+        force = self.fullRedraw
+        if force:
+            self.window.fill(BACKGROUNDGREY)
         
-        for button in self.buttons:
-            button.draw(self.window)
+        dirty = [button.draw(self.window, force) for button in self.buttons]
         
-        self.lengthInput.draw(self.window)
-        self.savedSelectionInput.draw(self.window)
+        dirty.append(self.lengthInput.draw(self.window, force))
+        dirty.append(self.savedSelectionInput.draw(self.window, force))
             
-        for gridInput in self.gridInputs.values():
-            gridInput.draw(self.window)
+        cells = self.board.draw(self.window, force)
             
-        self.informationTextbox.draw(self.window)
+        dirty.append(self.informationTextbox.draw(self.window, force))
             
-        if self.length and self.isGenerated:  # If board exists, display it
-            self.updateBoard()
+        if self.length and self.isGenerated:  # If board exists, draw its lines over the redrawn cells
+            if self.bordersChanged:
+                self.updateBoard()
+            # A redrawn cell only covered its own rect, so restoring the lines inside that rect is enough
+            origin = (self.xPos-1, self.yPos-1)
+            if force:
+                self.window.blit(self.borderLayer, origin)
+            for rect in [] if force else cells:
+                self.window.blit(self.borderLayer, rect.topleft, rect.move(-origin[0], -origin[1]))
             
         if self.overlay:    # If overlay toggled on, display the screenshot
-            self.window.blit(self.puzzle_img, (self.xPos, self.yPos))
+            if force:
+                self.window.blit(self.puzzle_img, (self.xPos, self.yPos))
+            for rect in [] if force else cells:
+                self.window.blit(self.puzzle_img, rect.topleft, rect.move(-self.xPos, -self.yPos))
         
 
-        pygame.display.update()
+        if force:
+            pygame.display.update()
+        else:
+            pygame.display.update([rect for rect in dirty + cells if rect])
+        self.fullRedraw = False
         
         
     
@@ -219,6 +254,8 @@ class App:
         self.buttons.append(Button(20, 380, 120, 40, function=self.solve,           text="Solve")) 
         self.buttons.append(Button(20, 440, 120, 40, function=self.toggleVisualise, text="Visualise")) 
         self.buttons.append(Button(20, 500, 120, 40, function=self.toggleOverlay,   text="Overlay")) 
+        self.buttons.append(Button(20, 560, 120, 40, function=self.toggleBackend,   text=self.backend.capitalize()))
+        self.buttons.append(Button(20, 620, 120, 40, function=self.toggleProfile,   text="Profile"))
         self.buttons.append(Button(20, 840, 120, 40, function=self.closeProgram,    text="Exit"))
         
         
@@ -237,6 +274,7 @@ class App:
     def generateBoard(self):
         if self.isInt(self.lengthInput.num):
             if int(self.lengthInput.num) <= 35 and int(self.lengthInput.num) >= 4:
+                self.abandonSolve()
                 self.defaultMessage = "Please input data..."
                 self.informationTextbox.text = self.defaultMessage
                 self.informationTextbox.updateFont()   
@@ -244,16 +282,11 @@ class App:
                 self.boardSize = self.length*cellSize              
                 self.xPos = (WIDTH - self.boardSize)//2
                 self.yPos = (HEIGHT - self.boardSize)//2 
-                self.gridInputs = {}
+                self.board = Board(self.length, self.xPos, self.yPos)
                 self.regions = []
-                for i in range(self.length):
-                    for j in range(self.length):
-                        obj = NumberInput(self.xPos+i*cellSize, self.yPos+j*cellSize,
-                                                           cellSize, cellSize, xPos=i, yPos=j, defaultColour=LIGHTGREY)
-                        self.gridInputs[(i,j)] = obj
-    
                         
                 self.isGenerated = True       
+                self.redrawBoard()
                 self.displayTempMessage(f"Successfully generated a {self.lengthInput.num}x{self.lengthInput.num} grid!", LIGHTBLUE)
             else:
                 self.displayTempMessage("Length must be between 4 and 35!", LIGHTRED)
@@ -264,8 +297,17 @@ class App:
 
 
                    
+    # Redraw the whole window next frame, rebuilding the region borders if they changed
+    def redrawBoard(self, bordersChanged=True):
+        self.fullRedraw = True
+        self.bordersChanged = self.bordersChanged or bordersChanged
+
+    # Draw the grid lines and region borders onto a transparent layer the size of the board (plus the width of
+    # a border), which is blitted over the cells. Only rebuilt when the board or its regions change
     def updateBoard(self):
-        for gridInput in self.gridInputs.values():
+        self.borderLayer = pygame.Surface((self.boardSize+3, self.boardSize+3), pygame.SRCALPHA)
+        self.bordersChanged = False
+        for gridInput in self.board.values():
 
             self.drawLine(self.xPos+gridInput.xPos*cellSize, self.yPos+gridInput.yPos*cellSize,
                               self.xPos+(gridInput.xPos+1)*cellSize, self.yPos+gridInput.yPos*cellSize,
@@ -284,8 +326,10 @@ class App:
                               thickness=3 if gridInput.west else 1) 
       
                 
+    # Draw a line given in window coordinates onto the border layer
     def drawLine(self, x, y, xx, yy, thickness=1):
-        pygame.draw.line(self.window, BLACK, (x,y), (xx,yy), thickness)
+        origin = (self.xPos-1, self.yPos-1)
+        pygame.draw.line(self.borderLayer, BLACK, (x-origin[0], y-origin[1]), (xx-origin[0], yy-origin[1]), thickness)
         
         
     # Checks if a string is a number
@@ -296,6 +340,10 @@ class App:
         except:
             return False  
         
+    # Plain puzzle description used for saving and solving
+    def getInformation(self):
+        return {"length": self.length, "regions": [{gridInput.getPos(): gridInput.num for gridInput in region.gridInputs} for region in self.regions]}
+
     # Display a 3 second message at the bottom of the screen
     def displayTempMessage(self, text, colour):
         self.informationTextbox.text = text
@@ -307,21 +355,30 @@ class App:
 ###### BUTTON FUNCTIONS ######
     def addGroup(self):
         if self.gridInputsSelected:                      # If there are gridInputs selected
+            self.abandonSolve()
             region = Region(self.gridInputsSelected)     # Create a new region object with the current gridInputs selected
             self.regions.append(region)                  # Add new region to list of regions
             region.groupGridInputs()                     # Group all gridInputs within region
             self.gridInputsSelected = []                 # Reset list of selected gridInputs
+            self.redrawBoard()
 
             
-        for gridInput in self.gridInputs.values():       # Check if all gridInputs are in a region, if so, the puzzle is ready to be solved
-            if not gridInput.inRegion:
-                return
+        if sum(len(region.gridInputs) for region in self.regions) < len(self.board):    # Ready to solve once every gridInput is in a region
+            return
             
         self.defaultMessage = "Ready to solve..."
         self.informationTextbox.text = self.defaultMessage
         self.displayTempMessage("Ready to solve...", LIGHTBLUE)
             
         
+    # A clue was entered or cleared. Once every gridInput is in a region the edited puzzle can be solved again,
+    # which the session does incrementally from the model of the last solve
+    def clueChanged(self):
+        if self.regions and sum(len(region.gridInputs) for region in self.regions) == len(self.board):
+            self.defaultMessage = "Ready to solve..."
+            self.informationTextbox.text = self.defaultMessage
+
+
     def removeGroup(self):
         toRemove = []                       # Create a list of regions to be removed
         for region in self.regions:         # Search for regions that are selected and reset their gridInputs to their default state
@@ -329,11 +386,13 @@ class App:
                 toRemove.append(region)
                 region.resetGridInputs()
         if toRemove:                        # Remove the selected regions
+            self.abandonSolve()
             self.defaultMessage = "Please input data..."
             self.informationTextbox.text = self.defaultMessage
             self.displayTempMessage(f"Regions removed", LIGHTBLUE)
             for region in toRemove:
                 self.regions.remove(region)
+            self.redrawBoard()
             
             
 
@@ -346,9 +405,11 @@ class App:
             
         # Otherwise, remove the last region if any
         elif self.regions:
+            self.abandonSolve()
             region = self.regions[-1]          # Get previous region
             region.resetGridInputs()           # Reset every gridInput to its default state
             self.regions = self.regions[:-1]   # Remove the region from regions
+            self.redrawBoard()
             self.defaultMessage = "Please input data..."
             self.informationTextbox.text = self.defaultMessage
             self.displayTempMessage(f"Region removed", LIGHTBLUE)
@@ -367,10 +428,22 @@ class App:
             self.buttons[7].colour = DARKBLUE
             self.displayTempMessage("Lazy constraints will now be visualised", LIGHTBLUE)
 
+    # Toggle profiling of solves. A profiled solve writes profile.json and profile.folded (flamegraph folded stacks)
+    def toggleProfile(self):
+        if self.profile:
+            self.profile = False
+            self.buttons[10].colour = BLUE
+            self.displayTempMessage("Solves will no longer be profiled", LIGHTBLUE)
+        else:
+            self.profile = True
+            self.buttons[10].colour = DARKBLUE
+            self.displayTempMessage("Solves will now be profiled to profile.json and profile.folded", LIGHTBLUE)
+
     # Toggle overlay of puzzle screenshot. Automatically positions and resizes the screenshot
     def toggleOverlay(self):
         if self.overlay:  # Disable overlay
             self.overlay = False
+            self.redrawBoard(bordersChanged=False)
             self.buttons[8].colour = BLUE
             self.displayTempMessage("Overlay toggled OFF", LIGHTBLUE)
         else:             # Enable overlay
@@ -379,15 +452,24 @@ class App:
                 self.puzzle_img = pygame.transform.scale(self.puzzle_img, (self.boardSize+3,self.boardSize+3))   # Resize screenshot to grid
                 self.puzzle_img.set_alpha(150)
                 self.overlay = True
+                self.redrawBoard(bordersChanged=False)
                 self.buttons[8].colour = DARKBLUE
                 self.displayTempMessage("Overlay toggled ON", LIGHTBLUE)
             except:
                 self.displayTempMessage("Failed to load puzzle png", LIGHTRED)
             
 
-    # Close the program. The solver reaches termination quicker when visualisation is disabled
+    # Cycle through the installed solver backends. The button shows the backend that Solve will use
+    def toggleBackend(self):
+        backends = availableBackends()
+        self.backend = backends[(backends.index(self.backend) + 1) % len(backends)]
+        self.buttons[9].setText(self.backend.capitalize())
+        self.displayTempMessage(f"Solving with the {self.backend} backend", LIGHTBLUE)
+
+
+    # Close the program, stopping any solve in progress
     def closeProgram(self):
-        self.visualise = False
+        self.stopRequested.set()
         self.running = False
 
 
@@ -396,46 +478,46 @@ class App:
     def saveSelection(self):      
         if self.defaultMessage == "Ready to solve...":
             save_number = int(self.savedSelectionInput.num)
-            with open(f"puzzle{save_number}.txt", "wb") as filehandle:
-                information = {"length": self.length, "regions": [{gridInput.getPos(): gridInput.num for gridInput in region.gridInputs} for region in self.regions]}
-                pickle.dump(information, filehandle) 
+            writePuzzle(self.getInformation(), f"puzzle{save_number}{EXTENSION}")
             self.displayTempMessage(f"Puzzle saved as puzzle {save_number}", LIGHTBLUE)
         else:
             self.displayTempMessage(f"Enter all puzzle data before saving!", LIGHTRED)
 
             
-    # Load puzzle template from file
+    # Load puzzle template from file, falling back to the legacy pickle file if there is no binary one
     def loadSelection(self):
         if self.savedSelectionInput.num:
             save_number = int(self.savedSelectionInput.num)
             try:     
-                with open(f"puzzle{save_number}.txt", "rb") as filehandle:
-                    information = pickle.load(filehandle)
+                path = f"puzzle{save_number}{EXTENSION}"
+                if not os.path.exists(path):
+                    path = f"puzzle{save_number}.txt"
+                information = loadPuzzle(path)
+                self.abandonSolve()
                 self.lengthInput.num = str(information["length"])
                 self.lengthInput.updateFont()
                 self.length = int(self.lengthInput.num)
                 self.boardSize = self.length*cellSize
                 self.xPos = (WIDTH - self.boardSize)//2
                 self.yPos = (HEIGHT - self.boardSize)//2
-                self.gridInputs = {}
+                self.board = Board(self.length, self.xPos, self.yPos)
                 self.regions = []
                 
                 for region in information["regions"]:
                     region_number = -1
                     gridInputs = []
                     for (i,j), number in region.items():
-                        gridInput_obj = NumberInput(self.xPos + i*cellSize, self.yPos + j*cellSize, cellSize, cellSize, xPos=i, yPos=j, defaultColour=LIGHTGREY)
-                        self.gridInputs[(i,j)] = gridInput_obj
+                        gridInput_obj = self.board[(i,j)]
                         gridInputs.append(gridInput_obj)
                         if number:
                             gridInput_obj.num = number
                             region_number = number
-                            gridInput_obj.updateFont()
                     region_obj = Region(gridInputs=gridInputs, number=region_number)
                     self.regions.append(region_obj)
                     region_obj.groupGridInputs()
                             
                 self.isGenerated = True
+                self.redrawBoard()
                 self.defaultMessage = "Ready to solve..."
                 self.displayTempMessage(f"Successfully loaded puzzle {save_number}!", LIGHTBLUE)
                 
@@ -462,320 +544,135 @@ class App:
         if j>0:
             neighbours.append((i,j-1))
         return neighbours
-    
-    # Return all diagonal neighbours of a cell
-    def diagonalNeighbours(self, cell):
-        neighbours = []
-        i,j = cell
-        if i-1>=0 and j-1>=0:
-            neighbours.append((i-1, j-1))
-        if i-1>=0 and j+1<=self.length-1:
-            neighbours.append((i-1, j+1))
-        if i+1<=self.length-1 and j+1<=self.length-1:
-            neighbours.append((i+1, j+1))
-        if i+1<=self.length-1 and j-1>=0:
-            neighbours.append((i+1, j-1))
-        return neighbours       
-    
-    
-    # Iterate south until a string of cells has been collected that spans exactly 3 regions. 
-    # Otherwise, return False
-    def vertNeigh(self, cell):    
-        neighbours = []
-        regions = []
-        for i in range(cell[1], self.length):
-            neighbours.append((cell[0], i))
-            for region in self.regions:
-                if (cell[0], i) in region.getPos():
-                    if region not in regions:
-                        regions.append(region)
-                    if len(regions) >= 3:
-                        return neighbours
-        return False
-        
-    # Iterate east until a string of cells has been collected that spans exactly 3 regions. 
-    # Otherwise, return False        
-    def horNeigh(self, cell):       
-        neighbours = []
-        regions = []
-        for i in range(cell[0], self.length):
-            neighbours.append((i, cell[1]))
-            for region in self.regions:
-                if (i, cell[1]) in region.getPos():
-                    if region not in regions:
-                        regions.append(region)
-                    if len(regions) >= 3:
-                        return neighbours
-        return False      
-    
-    
-               
-###### SOLVER HELPER FUNCTIONS ######                
 
 
-    # Iterate through all diagonally connected black cells. If two distinct boundary points have been found,
-    # then an impenetrable black wall has been found.
-    def followBlackCells(self, cell, XV):
-        if cell in self.visitedCells:
-            return
-        if cell[0] == 0 or cell[0] == self.length-1 or cell[1] == 0 or cell[1] == self.length-1: # If cell on boundary
-            self.boundaryCells += 1
-        self.visitedCells.append(cell)
-        self.visitedBlackCells.append(cell)
-        if self.boundaryCells > 1:
-            return
-        for (i,j) in self.diagonalNeighbours(cell):
-            if XV[(i,j,1)] > 0.9:
-                self.followBlackCells((i,j), XV)      
-              
-                
-                
-                
-                
-    # Iterate through all diagonally connected black cells. If we revisit a cell which is NOT the previous cell,
-    # then a loop of black cells has been found.                
-    def followBlackCells_Loop(self, prevCell, cell, XV):
-        if cell in self.visitedCells:
-            return
-        self.visitedCells.append(cell)
-        self.visitedBlackCells.append(cell)
-        for (i,j) in self.diagonalNeighbours(cell):
-            if XV[(i,j,1)] > 0.9:    # if the neighbouring cell is black
-                if (i,j) != prevCell and (i,j) in self.visitedCells:    # If the neighbouring cell is NOT the previous cell but it has been visited, then we have found a loop
-                    self.loopFound = True
-                    return
-                if not self.loopFound:
-                    self.followBlackCells_Loop(cell, (i,j), XV)   
-                    
-                    
-    # "Chop off" any tails on an impenetrable wall (loopMode=False) or on a loop (loopMode=True).
-    # This makes the lazy constraint tighter and improves runtime.
-    def purgeTrails(self, loopMode):
-        trailExists = True
-        while trailExists:
-            trailExists = False
-            for cell in self.visitedCells:
-                if not loopMode:
-                    if cell[0] == 0 or cell[0] == self.length-1 or cell[1] == 0 or cell[1] == self.length-1: # If on boundary, don't count as endpoint
-                        continue
-                neighbours = self.diagonalNeighbours(cell)
-                if len(set(self.visitedCells).intersection(neighbours)) == 1: # Found an endpoint
-                    trailExists = True
-                    self.visitedCells.remove(cell)
-                    
-                    
-               
-                
- 
-                
+
 ###### SOLVER ######
+    # Start solving on a worker thread, or cancel the solve that is running. The worker only posts
+    # (kind, ...) events to self.solverEvents, which the main loop drains in drainSolverEvents at its own frame rate
     def solve(self):
-        if self.defaultMessage == "Ready to solve...":
-            self.lazyConstraintsAdded = 0
-            for gridInput in self.gridInputs.values():
+        if self.solverThread and self.solverThread.is_alive():
+            self.stopRequested.set()
+            self.displayTempMessage("Cancelling...", LIGHTRED)
+        elif self.defaultMessage == "Ready to solve...":
+            for gridInput in self.board.values():
                 gridInput.inSolver = True
                 gridInput.defaultColour = LIGHTGREY
             self.defaultMessage = "Solving"
             self.informationTextbox.text = self.defaultMessage
             self.informationTextbox.updateFont()
-            
-            m = Model("Heyawake Solver")
-            
-            X = {(i,j,col):
-                m.addVar(vtype=GRB.BINARY)
-                for (i,j) in self.gridInputs.keys() for col in [0,1]}
-                
-          
-                
-                 
-            SelectOne = {(i,j):
-                m.addConstr(X[i,j,0] + X[i,j,1] == 1)
-                for (i,j) in self.gridInputs.keys()}
-                
-       
-            RegionNumber = []
-            for region in self.regions:
-                if int(region.number) >= 0:
-                    cells = region.getPos()
-                    RegionNumber.append(m.addConstr(quicksum(X[cell[0], cell[1], 1] for cell in cells) == int(region.number)))
-                    
-       
-            AdjacentBlack = {(i,j):
-                m.addConstr(quicksum(X[ii,jj,1] for (ii,jj) in self.cellNeigh((i,j))) <= len(self.cellNeigh((i,j)))*(1 - X[i,j,1]))
-                for (i,j) in self.gridInputs.keys()}
-                
-        
-            VertOrth = {}
-            for (i,j), gridInput in self.gridInputs.items():
-                if gridInput.south:
-                    neighbours = self.vertNeigh(gridInput.getPos())
-                    if neighbours:
-                        VertOrth[(i,j)] = m.addConstr(quicksum(X[ii,jj,1] for (ii,jj) in neighbours) >= 1)
-    
 
-            HorOrth = {}
-            for (i,j), gridInput in self.gridInputs.items():
-                if gridInput.east:
-                    neighbours = self.horNeigh(gridInput.getPos())
-                    if neighbours:
-                        HorOrth[(i,j)] = m.addConstr(quicksum(X[ii,jj,1] for (ii,jj) in neighbours) >= 1)     
-                        
-        
+            self.stopRequested.clear()
+            self.buttons[6].setText("Cancel")
+            self.profiler = Profiler(self.profile)
+            self.solverThread = threading.Thread(target=self.solveWorker,
+                                                 args=(self.getInformation(), self.backend, self.profiler, self.solveGeneration), daemon=True)
+            self.solverThread.start()
 
-            ConnectedAtLeast = {(i,j):
-                m.addConstr(quicksum(X[ii,jj,0] for (ii,jj) in self.cellNeigh((i,j))) >= X[i,j,0])
-                for (i,j) in self.gridInputs.keys()}
-            
-            
-                
-                
-    
-            def Callback(model, where):
-                if where==GRB.Callback.MIPSOL:
-              
-            
-                    XV = {k: v for (k,v) in zip(X.keys(), model.cbGetSolution(list(X.values())))}
-                        
-                    """ Update current solution on the grid"""
-                    for (i,j), gridInput in self.gridInputs.items():
-                        if XV[(i,j,1)] > 0.9:
-                            gridInput.defaultColour = DARKGREY
-                            if gridInput.num:
-                                gridInput.updateFont(textColour=WHITE)
-                        else:
-                            gridInput.defaultColour = WHITE  
-                            if gridInput.num:
-                                gridInput.updateFont(textColour=BLACK)
-                        
-                    self.events()
-                    self.update()
-                    self.draw()      
-                    
 
-                    
-                    """ Check if any string of black cells forms a wall with endpoints
-                    on the boundary. In any connected string, if there are 2 or more 
-                    black cells on the boundary, then this must contain an impenetrable wall.
-                    We then run a second function purgeTrails, which 'chops off' the tails
-                    on this connected string of black cells.
-                    A lazy constraint prevents this wall from happening again.
-                    """                
-                    self.visitedBlackCells = []
-                    for k in XV: 
-                        if k[0] in [0, self.length-1] or k[1] in [0, self.length-1]:                    # If cell on boundary
-                            if XV[(k[0],k[1],1)] > 0.9 and (k[0], k[1]) not in self.visitedBlackCells:  # If cell is black and hasn't been checked yet
-                                self.boundaryCells = 0
-                                self.visitedCells = []
-                                self.followBlackCells((k[0],k[1]), XV)
-                                if self.boundaryCells > 1:
-                                
-                                    if self.visualise:
-                                        for cell in self.visitedCells:
-                                            self.gridInputs[cell].defaultColour = GREEN
-                                        self.events()
-                                        self.update()
-                                        self.draw()                                        
-                                        time.sleep(2)
-                                        for cell in self.visitedCells:
-                                            self.gridInputs[cell].defaultColour = DARKGREY
-                                        self.events()
-                                        self.update()
-                                        self.draw()
-                               
-                                    # PURGE TRAILING POINTS:
-                                    self.purgeTrails(loopMode=False)
-                                    
-                                    if self.visualise:
-                                        for cell in self.visitedCells:
-                                            self.gridInputs[cell].defaultColour = DARKGREEN
-                                        self.events()
-                                        self.update()
-                                        self.draw()
-                                        time.sleep(2)                                       
-                                        
-                                        for cell in self.visitedCells:
-                                            self.gridInputs[cell].defaultColour = DARKGREY
-                                        self.events()
-                                        self.update()
-                                        self.draw()  
-                                        
-                                    
-                                    self.lazyConstraintsAdded += 1
-                                    model.cbLazy(quicksum(X[(i,j,1)] for (i,j) in self.visitedCells) <= len(self.visitedCells) - 1)
-                                    break
-                                                                     
-                         
-                        
-                                
-                    """ Check if any string of black cells forms a closed loop. If we iterate through
-                    all connected cells and find a cell which we have already visited but is NOT the previous cell,
-                    then we have found a connected string of black cells which contains a loop.
-                    We then run a second function purgeTrails, which 'chops off' the tails
-                    on this loop of black cells.
-                    If such a loop exists, a lazy constraint is added to prevent it.
-                    """                    
-                    self.visitedBlackCells = []
-                    for k in XV:
-                        if XV[(k[0],k[1],1)] > 0.9 and (k[0],k[1]) not in self.visitedBlackCells:  # If cell is black and hasn't been checked yet
-                            self.loopFound = False
-                            self.visitedCells = []
-                            self.followBlackCells_Loop(0,(k[0],k[1]), XV)
-                            if self.loopFound:
-                                
-                                if self.visualise:
-                                    for cell in self.visitedCells:
-                                        self.gridInputs[cell].defaultColour = BLUE
-                                    self.events()
-                                    self.update()
-                                    self.draw()
-                                    time.sleep(2)
-                                    
-                                    
-                                    
-                                    for cell in self.visitedCells:
-                                        self.gridInputs[cell].defaultColour = DARKGREY
-                                    self.events()
-                                    self.update()
-                                    self.draw()                           
-                                
-                                # PURGE TRAILING POINTS:
-                                self.purgeTrails(loopMode = True)
-                                
-                                if self.visualise:
-                                    for cell in self.visitedCells:
-                                        self.gridInputs[cell].defaultColour = DARKBLUE
-                                    self.events()
-                                    self.update()
-                                    self.draw()
-                                    time.sleep(2)
-                                    
-                                                                       
-                                    for cell in self.visitedCells:
-                                        self.gridInputs[cell].defaultColour = DARKGREY
-                                    self.events()
-                                    self.update()
-                                    self.draw()   
-                                    
-                                
-                                self.lazyConstraintsAdded += 1
-                                model.cbLazy(quicksum(X[(i,j,1)] for (i,j) in self.visitedCells) <= len(self.visitedCells) - 1)
-                                break
-                            
-                    if not self.running:
-                        print("Terminating")
-                        self.visualise = False
-                        model.terminate()
-
-   
-                                          
-            m.setParam('LazyConstraints', 1)            
-            m.optimize(Callback)
-            
-            
-            if m.status == 2:
-                self.defaultMessage = f"Solved in {round(m.runtime,2)} seconds! {self.lazyConstraintsAdded} walls/loops were found before solution reached"
-                self.displayTempMessage(f"Solved in {round(m.runtime,2)} seconds! {self.lazyConstraintsAdded} walls/loops were found before solution reached", GREEN)  
+    # Runs on the worker thread, so it must not touch pygame or any widget. Every event is tagged with generation,
+    # the number of the solve it belongs to
+    def solveWorker(self, information, backend, profiler, generation):
+        post = lambda *event: self.solverEvents.put((generation,) + event)
+        try:
+            solution = self.session.solve(information, backend=backend, profiler=profiler,
+                                          onSolution=lambda shaded: post("solution", shaded),
+                                          onCut=lambda kind, trail, core: post("cut", kind, trail, core),
+                                          shouldStop=self.stopRequested.is_set)
+        except Exception as error:
+            post("error", error)
+        else:
+            post("done", solution)
+
+
+    # Called before any change to the puzzle. The solve of the puzzle as it was is cancelled if it is still running,
+    # and the events it has posted or has yet to post are dropped, since they refer to a board that is about to change
+    def abandonSolve(self):
+        if self.solverThread and self.solverThread.is_alive():
+            self.stopRequested.set()
+            self.buttons[6].setText("Solve")
+        self.solveGeneration += 1
+        self.cutSteps = []
+
+
+    # Apply the events posted by the solver since the last frame. A visualised cut is shown for 2 seconds
+    # (its trail, then its core) before any later events are applied, while the solver carries on regardless
+    def drainSolverEvents(self):
+        if self.cutSteps:
+            if time.perf_counter() - self.cutStepTime < 2:
+                return
+            for cell in self.cutSteps.pop(0)[0]:
+                self.board[cell].defaultColour = DARKGREY
+            if self.cutSteps:
+                self.showCutStep()
+                return
+
+        while not self.solverEvents.empty():
+            generation, *event = self.solverEvents.get()
+            if generation != self.solveGeneration:
+                continue
+            if event[0] == "solution":
+                self.showSolution(event[1])
+            elif event[0] == "cut":
+                if self.visualise:
+                    self.showCut(*event[1:])
+                    return
+            elif event[0] == "done":
+                self.buttons[6].setText("Solve")
+                self.showResult(event[1])
+            elif event[0] == "error":
+                self.buttons[6].setText("Solve")
+                self.defaultMessage = "Ready to solve..."
+                self.displayTempMessage(f"Solver failed: {event[1]}", LIGHTRED)
+
+
+    def showResult(self, solution):
+        if solution.solved:
+            self.showSolution(solution.shaded)
+            self.defaultMessage = f"Solved in {round(solution.runtime,2)} seconds! {solution.lazyConstraintsAdded} walls/loops were found before solution reached"
+            self.displayTempMessage(f"Solved in {round(solution.runtime,2)} seconds! {solution.lazyConstraintsAdded} walls/loops were found before solution reached", GREEN)
+            if self.profile:
+                self.showProfile()
+        elif self.stopRequested.is_set():
+            self.defaultMessage = "Ready to solve..."
+            self.displayTempMessage("Solve cancelled", LIGHTRED)
+        else:
+            self.displayTempMessage(f"Solution not found in {round(solution.runtime,2)} seconds!", LIGHTRED)
+
+
+    # Write the profile of the last solve and report the part of the callback that took longest
+    def showProfile(self):
+        self.profiler.write("profile.json")
+        self.profiler.write("profile.folded")
+        parts = {name: section["total"] for name, section in self.profiler.sections.items() if name.startswith("optimize;callback;")}
+        if parts:
+            slowest = max(parts, key=parts.get)
+            self.displayTempMessage(f"Profile written: callbacks spent most time in {slowest.split(';')[-1]} ({round(parts[slowest]*1000)} ms)", GREEN)
+        else:
+            self.displayTempMessage("Profile written to profile.json and profile.folded", GREEN)
+
+
+    # Update current solution on the grid
+    def showSolution(self, shaded):
+        for (i,j), gridInput in self.board.items():
+            if (i,j) in shaded:
+                gridInput.defaultColour = DARKGREY
+                if gridInput.num:
+                    gridInput.updateFont(textColour=WHITE)
             else:
-                self.displayTempMessage(f"Solution not found in {round(m.runtime,2)} seconds!", LIGHTRED)  
-            
-            
+                gridInput.defaultColour = WHITE
+                if gridInput.num:
+                    gridInput.updateFont(textColour=BLACK)
+
+
+    # Visualise a wall or loop before and after its trails have been purged
+    def showCut(self, kind, trail, core):
+        trailColour, coreColour = (GREEN, DARKGREEN) if kind == "wall" else (BLUE, DARKBLUE)
+        self.cutSteps = [(trail, trailColour), (core, coreColour)]
+        self.showCutStep()
+
+    def showCutStep(self):
+        cells, colour = self.cutSteps[0]
+        for cell in cells:
+            self.board[cell].defaultColour = colour
+        self.cutStepTime = time.perf_counter()
@@ -0,0 +1,222 @@
+import pygame
+from array import array
+from settings import *
+from glyphs import glyph
+
+
+# Flags of a cell, as bits of Board.flags
+GROUPED   = 2
+LOCKED    = 4
+IN_REGION = 8
+IN_SOLVER = 16
+NORTH     = 32      # Region border on each side of the cell
+EAST      = 64
+SOUTH     = 128
+WEST      = 256
+
+
+# The puzzle grid of the interface, held in flat arrays indexed by i*length + j rather than as a widget per cell:
+# clues, flag bits and colours (as indices into a shared palette). Cells are drawn straight onto the window with
+# text from the shared glyph cache, so a 35x35 board needs neither a surface nor a font per cell.
+# Board[(i,j)] is a Cell, a lightweight view onto one cell with the interface of the old per-cell NumberInput
+class Board:
+    def __init__(self, length=0, x=0, y=0, size=cellSize):
+        self.length = length
+        self.x = x                  # Window position of the top left of the grid
+        self.y = y
+        self.size = size            # Cell size in pixels
+        self.fontSize = int(size/1.3)
+        count = length*length
+
+        self.clues = array("h", [-1])*count         # -1 for no clue
+        self.flags = array("H", [LOCKED])*count
+        self.palette = []                           # Colours used by the cells, indexed by the colour arrays
+        self.paletteIndex = {}
+        self.defaultColour = bytearray([self.colourIndex(LIGHTGREY)])*count
+        self.regionColour = bytearray([self.colourIndex(GREEN)])*count
+        self.textColour = bytearray([self.colourIndex(BLACK)])*count
+        self.drawnState = [None]*count              # Appearance of each cell when last drawn
+        self.regions = [None]*count                 # Region of each cell, kept up to date by Region
+        self.hovered = -1                           # Cell under the mouse, or -1
+        self.selected = -1                          # Cell selected by a left click, or -1. Only one cell is selected at a time
+
+        self.cells = [Cell(self, k) for k in range(count)]
+
+
+    def colourIndex(self, colour):
+        if colour not in self.paletteIndex:
+            self.paletteIndex[colour] = len(self.palette)
+            self.palette.append(colour)
+        return self.paletteIndex[colour]
+
+
+    # Dictionary-style access to the cells by (i,j)
+    def __getitem__(self, cell):
+        return self.cells[cell[0]*self.length + cell[1]]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def values(self):
+        return self.cells
+
+    def items(self):
+        return [(cell.getPos(), cell) for cell in self.cells]
+
+
+    # Track the cell under the mouse. Cells are laid out on a regular grid, so the cell at a pixel is found
+    # by division rather than by testing the rect of every cell
+    def update(self, mouse):
+        self.hovered = self.indexAt(mouse)
+
+    def indexAt(self, pixel):
+        i = (pixel[0] - self.x) // self.size
+        j = (pixel[1] - self.y) // self.size
+        return i*self.length + j if 0 <= i < self.length and 0 <= j < self.length else -1
+
+    # The Cell under the mouse, or None
+    def hoveredCell(self):
+        return self.cells[self.hovered] if self.hovered >= 0 else None
+
+    # The selected Cell, or None
+    def selectedCell(self):
+        return self.cells[self.selected] if self.selected >= 0 else None
+
+    # Draw the cells whose appearance changed since they were last drawn, or all of them with force=True.
+    # Returns the rects that were drawn
+    def draw(self, window, force=False):
+        return [rect for rect in (cell.draw(window, force) for cell in self.cells) if rect]
+
+
+
+# A view onto one cell of a Board. It holds nothing but its board and index, so creating one per cell is cheap
+class Cell:
+    __slots__ = ("board", "k")
+
+    def __init__(self, board, k):
+        self.board = board
+        self.k = k
+
+    # Properties reading and writing the board's arrays
+    def flag(bit):
+        def get(self):
+            return bool(self.board.flags[self.k] & bit)
+        def set(self, value):
+            if value:
+                self.board.flags[self.k] |= bit
+            else:
+                self.board.flags[self.k] &= ~bit
+        return property(get, set)
+
+    def colour(name):
+        def get(self):
+            return self.board.palette[getattr(self.board, name)[self.k]]
+        def set(self, value):
+            getattr(self.board, name)[self.k] = self.board.colourIndex(value)
+        return property(get, set)
+
+    isGrouped = flag(GROUPED)
+    isLocked = flag(LOCKED)
+    inRegion = flag(IN_REGION)
+    inSolver = flag(IN_SOLVER)
+    north = flag(NORTH)
+    east = flag(EAST)
+    south = flag(SOUTH)
+    west = flag(WEST)
+    defaultColour = colour("defaultColour")
+    regionColour = colour("regionColour")
+    del flag, colour
+
+
+    # The clue as a string, as the interface stores it, or None
+    @property
+    def num(self):
+        clue = self.board.clues[self.k]
+        return None if clue < 0 else str(clue)
+
+    @num.setter
+    def num(self, value):
+        self.board.clues[self.k] = int(value) if value else -1
+
+    @property
+    def xPos(self):
+        return self.k // self.board.length
+
+    @property
+    def yPos(self):
+        return self.k % self.board.length
+
+    def getPos(self):
+        return divmod(self.k, self.board.length)
+
+    @property
+    def isHighlighted(self):
+        return self.board.hovered == self.k
+
+    @property
+    def isSelected(self):
+        return self.board.selected == self.k
+
+    @isSelected.setter
+    def isSelected(self, value):
+        if value:
+            self.board.selected = self.k
+        elif self.board.selected == self.k:
+            self.board.selected = -1
+
+    # The Region the cell belongs to, or None
+    @property
+    def region(self):
+        return self.board.regions[self.k]
+
+    @region.setter
+    def region(self, value):
+        self.board.regions[self.k] = value
+
+    @property
+    def rect(self):
+        board = self.board
+        return pygame.Rect(board.x + self.xPos*board.size, board.y + self.yPos*board.size, board.size, board.size)
+
+
+    # Draw the cell if its appearance changed since it was last drawn, or always with force=True.
+    # Returns the rect that was drawn, or None
+    def draw(self, window, force=False):
+        if self.isSelected:
+            colour = LIGHTGREY
+        elif self.isGrouped:
+            colour = LIGHTGREEN
+        elif self.inSolver or not self.inRegion:
+            colour = self.defaultColour
+        else:
+            colour = self.regionColour
+
+        board = self.board
+        state = (colour, board.clues[self.k], board.textColour[self.k])
+        if state == board.drawnState[self.k] and not force:
+            return None
+        board.drawnState[self.k] = state
+
+        rect = self.rect
+        window.fill(colour, rect)
+        if self.num:
+            text = glyph(self.num, board.fontSize, board.palette[board.textColour[self.k]])
+            width, height = text.get_size()
+            window.blit(text, (rect.x + (rect.width-width)//2, rect.y + (rect.height-height)//2))
+        return rect
+
+    # Colour of the clue text
+    def updateFont(self, textColour=BLACK):
+        self.board.textColour[self.k] = self.board.colourIndex(textColour)
+
+    def reset(self):         # Reset to default state
+        self.isLocked = True
+        self.num = None
+        self.inRegion = False
+        self.region = None
+        self.regionColour = GREEN
+
+        self.west = False
+        self.south = False
+        self.east = False
+        self.north = False
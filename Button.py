@@ -1,11 +1,12 @@
 import pygame
 from settings import *
+from glyphs import font
 
 class Button:
     def __init__(self, x, y, width, height, text=None, colour=BLUE,
                  highlightedColour=LIGHTGREY, function=None):
         self.image = pygame.Surface((width, height))
-        self.font = pygame.font.SysFont("arial", 20, bold=1)
+        self.font = font(20)
         self.renderedText = self.font.render(text, False, BLACK)
         self.pos = (x,y)
         self.rect = self.image.get_rect()
@@ -17,6 +18,7 @@ class Button:
         self.width = width
         self.height = height
         self.isHighlighted = False
+        self.drawnState = None      # Appearance when last drawn, to skip redrawing an unchanged button
 
         
     def update(self, mouse):
@@ -25,12 +27,25 @@ class Button:
         else:
             self.isHighlighted = False
     
-    def draw(self, window):
-        self.image.fill(self.highlightedColour if self.isHighlighted else self.colour)
+    # Draw the button if its appearance changed since it was last drawn, or always with force=True.
+    # Returns the rect that was drawn, or None
+    def draw(self, window, force=False):
+        colour = self.highlightedColour if self.isHighlighted else self.colour
+        state = (colour, self.renderedText)
+        if state == self.drawnState and not force:
+            return None
+        self.drawnState = state
+
+        self.image.fill(colour)
         if self.text:
             self.drawText(self.text)
         window.blit(self.image, self.pos)
+        return self.rect
     
+    def setText(self, text):
+        self.text = text
+        self.renderedText = self.font.render(text, False, BLACK)
+
     def click(self):
         self.function()
         
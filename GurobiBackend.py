@@ -0,0 +1,292 @@
+import time
+from gurobipy import *
+from Solver import Solution, gridTable
+from Profiler import DISABLED
+
+
+# The smallest walls and loops, which can be enumerated from the grid size alone: the orthogonal neighbours of every
+# cell, which would shut it off from the other white cells. At a corner they form a wall of length 2, along an edge
+# a wall of length 3 and inside the grid a diamond loop of 4 cells. These are exactly the rows of the orthogonal
+# neighbour table, so the pool is built once per length along with it
+def cutPool(length):
+    return gridTable(length).orthogonal.cells
+
+
+# Solves a puzzle as a MIP with Gurobi. Walls and loops of black cells are cut off lazily
+# in a MIPSOL callback as they appear in candidate solutions, every distinct one in a candidate at once,
+# and separated from the fractional LP relaxation near the root in a MIPNODE callback as user cuts.
+# The smallest ones (see cutPool) are in the model from the start.
+# The model is kept between solves: after update() swaps in an edited puzzle of the same size, only the
+# constraints that depend on the regions are replaced. Walls and loops are invalid whatever the regions, so
+# every cut found so far stays in the model, and the last solution is offered to Gurobi as a MIP start
+class GurobiBackend:
+    def __init__(self, solver):
+        self.solver = solver
+        self.model = None
+        self.cuts = set()           # Cells of every wall/loop cut off so far, as sorted tuples
+        self.lazyConstraintsAdded = 0
+        self.userCutsAdded = 0
+        self.callbackCount = 0
+        self.callbackTime = 0.0
+
+
+    # Build the model for self.solver
+    def build(self, adjacency):
+        solver = self.solver
+        m = Model("Heyawake Solver")
+        self.model = m
+        self.adjacency = adjacency
+
+        # X[i,j] = 1 if cell (i,j) is black. White cells are expressed as 1 - X[i,j]
+        X = {(i,j):
+            m.addVar(vtype=GRB.BINARY)
+            for (i,j) in solver.cells}
+        self.X = X
+        self.blackVars = [X[i,j] for (i,j) in solver.cells]
+
+
+        # Constraints that depend on the regions are keyed by their cells, so that update() can tell which changed
+        self.RegionNumber = {}
+        self.VertOrth = {}
+        self.HorOrth = {}
+        self.addRegionConstraints(solver)
+
+
+        # Neighbours of each cell as indices into blackVars, from the neighbour table shared with the callback
+        neighbours = solver.orthogonalTable
+        blackVars = self.blackVars
+
+        if adjacency == "pairwise":
+            AdjacentBlack = {(k,kk):
+                m.addConstr(blackVars[k] + blackVars[kk] <= 1)
+                for k in range(len(blackVars)) for kk in neighbours[k] if kk > k}
+        else:
+            AdjacentBlack = {k:
+                m.addConstr(quicksum(blackVars[kk] for kk in neighbours[k]) <= len(neighbours[k])*(1 - blackVars[k]))
+                for k in range(len(blackVars))}
+
+
+        ConnectedAtLeast = {k:
+            m.addConstr(quicksum(1 - blackVars[kk] for kk in neighbours[k]) >= 1 - blackVars[k])
+            for k in range(len(blackVars))}
+
+
+        # ConnectedAtLeast already keeps these out of integer solutions, but is weaker in the LP relaxation.
+        # Lazy = 3 leaves them out of the LP until they cut off a relaxation, including at the root
+        for cells in cutPool(solver.length):
+            if len(cells) > 1:
+                m.addConstr(quicksum(X[cell] for cell in cells) <= len(cells) - 1).Lazy = 3
+
+
+    # Add the RegionNumber, VertOrth and HorOrth constraints of solver that are not in the model yet
+    def addRegionConstraints(self, solver):
+        m, X = self.model, self.X
+        for cells, number in solver.regions:
+            key = (frozenset(cells), number)
+            if number >= 0 and key not in self.RegionNumber:
+                self.RegionNumber[key] = m.addConstr(quicksum(X[cell] for cell in cells) == number)
+
+        for runs, constraints in [(solver.vertRuns(), self.VertOrth), (solver.horRuns(), self.HorOrth)]:
+            for run in runs.values():
+                key = tuple(run)
+                if key not in constraints:
+                    constraints[key] = m.addConstr(quicksum(X[cell] for cell in run) >= 1)
+
+
+    # Switch to an edited puzzle. Returns False if the model can't be reused, because the grid size changed
+    def update(self, solver):
+        if solver.length != self.solver.length:
+            return False
+        self.solver = solver
+        if self.model is None:
+            return True
+
+        regions = {(frozenset(cells), number) for cells, number in solver.regions}
+        runs = [{tuple(run) for run in solver.vertRuns().values()}, {tuple(run) for run in solver.horRuns().values()}]
+        for constraints, current in [(self.RegionNumber, regions), (self.VertOrth, runs[0]), (self.HorOrth, runs[1])]:
+            for key in [key for key in constraints if key not in current]:
+                self.model.remove(constraints.pop(key))
+        self.addRegionConstraints(solver)
+        return True
+
+
+    # Optimise the model, with the cells in decided (cell: 1 if black, 0 if white) fixed.
+    # verbose=False silences the Gurobi log and threads caps the number of threads Gurobi may use.
+    # adjacency="pairwise" forbids adjacent black cells with one X[a] + X[b] <= 1 row per pair of
+    # neighbours, which is tighter than the default big-M row per cell ("bigM").
+    # measureBound=True also solves the LP relaxation to report Solution.lpBound.
+    # verifyUnique=True searches for a second solution after the first (see Solution.unique).
+    # separate=False turns off the separation of walls and loops from the LP relaxation. Separation is costly on large
+    # grids, so it only runs at the first separateNodes nodes (1: the root only), tries at most separateStarts
+    # cells as the start of a loop, and stops looking for loops after separateTime seconds per call.
+    # profiler (see Profiler.py) times the optimisation and the parts of the callback inside it: solution fetch,
+    # interface updates, the components pass, wall search, loop search and cut emission ("optimize;callback;fetch" etc.)
+    def solve(self, decided, onSolution=None, onCut=None, shouldStop=None, verbose=True, threads=None, adjacency="bigM",
+              measureBound=False, verifyUnique=False, separate=True, separateNodes=1, separateStarts=20, separateTime=0.05,
+              profiler=DISABLED):
+        solver = self.solver
+        self.lazyConstraintsAdded = 0
+        self.userCutsAdded = 0
+        self.callbackCount = 0
+        self.callbackTime = 0.0
+        buildStart = time.perf_counter()
+
+        if self.model is None or adjacency != self.adjacency:
+            self.build(adjacency)
+            for cells in self.cuts:
+                self.model.addConstr(quicksum(self.X[cell] for cell in cells) <= len(cells) - 1)
+        m, X, blackVars = self.model, self.X, self.blackVars
+
+
+        # Fix the cells decided by the presolve, releasing those fixed for the previous puzzle
+        for cell, var in X.items():
+            var.lb = decided.get(cell, 0)
+            var.ub = decided.get(cell, 1)
+
+
+        buildTime = time.perf_counter() - buildStart
+
+        # Measure the strength of the formulation: the most black cells its LP relaxation allows.
+        # The closer this is to the number of black cells in the solution, the tighter the formulation
+        lpBound = None
+        if measureBound:
+            m.update()
+            relaxation = m.relax()
+            relaxation.setParam('OutputFlag', 0)
+            relaxation.setObjective(quicksum(relaxation.getVars()), GRB.MAXIMIZE)
+            relaxation.optimize()
+            if relaxation.status == GRB.OPTIMAL:
+                lpBound = relaxation.objVal
+
+        # Lazy constraints only last for one optimisation, so the cuts found in it are made permanent after it,
+        # for the next optimisation and the next solve
+        newCuts = []
+        def keepCuts():
+            for cells in newCuts:
+                key = tuple(sorted(cells))
+                if key not in self.cuts:
+                    self.cuts.add(key)
+                    m.addConstr(quicksum(X[cell] for cell in key) <= len(key) - 1)
+            newCuts.clear()
+
+        def Callback(model, where):
+            if where==GRB.Callback.MIPSOL:
+                callbackStart = time.perf_counter()
+
+                with profiler.time("optimize;callback;fetch"):
+                    black = [v > 0.9 for v in model.cbGetSolution(blackVars)]
+
+                if onSolution:
+                    with profiler.time("optimize;callback;ui"):
+                        onSolution({cell for cell, isBlack in zip(solver.cells, black) if isBlack})
+
+
+                """ Check if any string of black cells forms a wall with endpoints
+                on the boundary, or a closed loop. In any connected string, if there are 2 or more
+                black cells on the boundary, then this must contain an impenetrable wall, and we
+                cut off the shortest path between each pair of its boundary cells. If a connected
+                string contains a cycle, then it contains a loop: purgeTrails 'chops off' the tails
+                on this connected string of black cells, and we cut off the shortest cycle through
+                every edge that closed a cycle, so that each loop in the string gets its own cut.
+                Lazy constraints prevent every wall and loop in the candidate from happening again,
+                so Gurobi doesn't have to rediscover them one incumbent at a time.
+                """
+                with profiler.time("optimize;callback;components"):     # Walls and loops come from one pass over the black cells
+                    walls, loops = solver.findWallsAndLoops(black)
+                profiler.count("walls", len(walls))
+                profiler.count("loops", len(loops))
+
+                # Cuts by their sorted cells, so that a wall or loop found more than once is only cut once
+                cuts = {}
+                for wall in walls:
+                    with profiler.time("optimize;callback;wall"):
+                        shortest = solver.shortestWalls(wall)
+                    for visitedCells in shortest:
+                        cuts.setdefault(tuple(sorted(visitedCells)), ("wall", wall, visitedCells))
+
+                for loop, closing in loops:
+                    # PURGE TRAILING POINTS, then find the cycles in what is left:
+                    with profiler.time("optimize;callback;loop"):
+                        shortest = solver.shortestLoops(solver.purgeTrails(loop), closing)
+                    for visitedCells in shortest:
+                        cuts.setdefault(tuple(sorted(visitedCells)), ("loop", loop, visitedCells))
+
+                for kind, trail, visitedCells in cuts.values():
+                    if onCut:
+                        with profiler.time("optimize;callback;ui"):
+                            onCut(kind, trail, visitedCells)
+
+                    self.lazyConstraintsAdded += 1
+                    newCuts.append(visitedCells)
+                    with profiler.time("optimize;callback;cuts"):
+                        model.cbLazy(quicksum(X[i,j] for (i,j) in visitedCells) <= len(visitedCells) - 1)
+
+                if shouldStop and shouldStop():
+                    print("Terminating")
+                    model.terminate()
+
+                self.callbackCount += 1
+                self.callbackTime += time.perf_counter() - callbackStart
+                if profiler.enabled:
+                    profiler.record("optimize;callback", time.perf_counter() - callbackStart)
+                    profiler.count("cuts", len(cuts))
+
+            # Cut off the walls and loops that the LP relaxation at this node fractionally allows, before Gurobi
+            # branches on it. These cuts only tighten the relaxation, so they are user cuts rather than lazy constraints
+            elif (where==GRB.Callback.MIPNODE and separate and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL
+                  and model.cbGet(GRB.Callback.MIPNODE_NODCNT) < separateNodes):
+                with profiler.time("optimize;separation"):
+                    values = model.cbGetNodeRel(blackVars)
+                    cuts = solver.fractionalWallsAndLoops(values, maxStarts=separateStarts, timeLimit=separateTime)
+                    for cells in cuts:
+                        model.cbCut(quicksum(X[cell] for cell in cells) <= len(cells) - 1)
+                self.userCutsAdded += len(cuts)
+                profiler.count("userCuts", len(cuts))
+                if shouldStop and shouldStop():
+                    model.terminate()
+
+            # Between incumbents, still poll shouldStop so that a long search can be cancelled
+            elif where==GRB.Callback.MIP and shouldStop and shouldStop():
+                model.terminate()
+
+
+
+        m.setParam('OutputFlag', 1 if verbose else 0)
+        m.setParam('Threads', threads or 0)
+        m.setParam('LazyConstraints', 1)
+        m.setParam('PreCrush', 1 if separate else 0)     # User cuts refer to the original variables, so presolve must keep them translatable
+        with profiler.time("optimize"):
+            m.optimize(Callback)
+
+        solution = Solution(m.status == GRB.OPTIMAL, runtime=m.runtime, lazyConstraintsAdded=self.lazyConstraintsAdded,
+                            buildTime=buildTime, nodeCount=int(m.NodeCount), lpBound=lpBound)
+        if solution.solved:
+            solution.shaded = {(i,j) for (i,j) in solver.cells if X[i,j].x > 0.9}
+        keepCuts()      # Before the second optimisation below, which would otherwise have to find them again
+
+        if solution.solved:
+            # Look for a second solution in the same model: a no-good cut forbids the first one, so the
+            # next optimisation either finds a solution that differs in at least one cell or proves there is none
+            if verifyUnique:
+                NoGood = m.addConstr(quicksum(1 - X[cell] if cell in solution.shaded else X[cell] for cell in solver.cells) >= 1)
+                with profiler.time("optimize"):
+                    m.optimize(Callback)
+                solution.runtime += m.runtime
+                solution.nodeCount += int(m.NodeCount)
+                solution.lazyConstraintsAdded = self.lazyConstraintsAdded
+                if m.status == GRB.OPTIMAL:
+                    solution.unique = False
+                    solution.secondShaded = {(i,j) for (i,j) in solver.cells if X[i,j].x > 0.9}
+                elif m.status == GRB.INFEASIBLE:
+                    solution.unique = True
+                m.remove(NoGood)
+                keepCuts()
+
+            # Start the next solve from the first solution
+            for cell, var in X.items():
+                var.Start = int(cell in solution.shaded)
+
+        solution.userCutsAdded = self.userCutsAdded
+        solution.callbackCount = self.callbackCount
+        solution.callbackTime = self.callbackTime
+        return solution
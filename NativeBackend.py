@@ -0,0 +1,235 @@
+import time
+from Solver import Solution
+from Profiler import DISABLED
+
+
+# Pure-Python search backend that needs no solver licence.
+# The board is held as two bitsets (Python ints), one of black cells and one of white cells, with cell (i,j)
+# at bit i*(length+1) + j. The spare bit at the end of every row stops shifts by one from wrapping into the
+# next row, so orthogonal neighbours of a whole set of cells are found with four shifts.
+# The search is depth-first, propagating the puzzle rules to a fixpoint at every node.
+class NativeBackend:
+    def __init__(self, solver):
+        self.solver = solver
+        self.width = solver.length + 1
+        self.bit = {(i,j): 1 << (i*self.width + j) for (i,j) in solver.cells}
+        self.full = sum(self.bit.values())
+        self.size = self.full.bit_length()
+        # Bit indices of the orthogonal neighbours of every cell
+        self.adjacent = [[] for k in range(self.size)]
+        for (i,j), bit in self.bit.items():
+            self.adjacent[bit.bit_length() - 1] = [self.bit[cell].bit_length() - 1 for cell in solver.cellNeigh((i,j))]
+
+        self.regionMasks = [(self.mask(cells), number) for cells, number in solver.regions if number >= 0]
+        self.runMasks = [self.mask(run) for run in list(solver.vertRuns().values()) + list(solver.horRuns().values())]
+        self.nodeCount = 0
+        self.shouldStop = None      # Polled during the search, see solve
+        self.stopped = False        # Set when shouldStop ended the search early
+
+
+    # Nothing is worth keeping between solves, so an edited puzzle gets a new backend
+    def update(self, solver):
+        return False
+
+
+    def mask(self, cells):
+        return sum(self.bit[cell] for cell in cells)
+
+    # The cells of a bitset
+    def shaded(self, bits):
+        return {cell for cell, bit in self.bit.items() if bits & bit}
+
+    # Every cell orthogonally adjacent to a cell in cells
+    def neighbours(self, cells):
+        return (cells << 1 | cells >> 1 | cells << self.width | cells >> self.width) & self.full
+
+    # The white cells must stay connected through cells that are not black. Returns a bitset of the
+    # undecided cells that are cut vertices of the non-black cells, separating white cells from each other,
+    # which must therefore be white. Returns None if the white cells are already disconnected.
+    # Walls and loops of black cells are caught here as soon as they form, since the cells next to a black
+    # cell are white on both sides. Found with an iterative Tarjan depth-first search that also counts the
+    # white cells below each cell
+    def cutVertices(self, black, white):
+        if not white:
+            return 0
+        size = self.size
+        passable = format(self.full & ~black, f"0{size}b")[::-1]    # passable[k] == "1" if bit k is not black
+        isWhite = format(white, f"0{size}b")[::-1]
+        totalWhite = white.bit_count()
+        adjacent = self.adjacent
+
+        discovery = [0]*size        # 0 if not yet visited
+        low = [0]*size
+        whiteBelow = [0]*size
+        forced = 0
+
+        root = (white & -white).bit_length() - 1
+        discovery[root] = low[root] = 1
+        whiteBelow[root] = 1
+        visited = 1
+        stack = [(root, -1, iter(adjacent[root]))]
+        while stack:
+            cell, parent, neighbours = stack[-1]
+            for neighbour in neighbours:
+                if passable[neighbour] != "1" or neighbour == parent:
+                    continue
+                if discovery[neighbour]:
+                    if discovery[neighbour] < low[cell]:
+                        low[cell] = discovery[neighbour]
+                else:
+                    visited += 1
+                    discovery[neighbour] = low[neighbour] = visited
+                    whiteBelow[neighbour] = isWhite[neighbour] == "1"
+                    stack.append((neighbour, cell, iter(adjacent[neighbour])))
+                    break
+            else:
+                stack.pop()
+                if parent >= 0:
+                    if low[cell] < low[parent]:
+                        low[parent] = low[cell]
+                    whiteBelow[parent] += whiteBelow[cell]
+                    # Removing parent separates the subtree below cell from the rest
+                    if low[cell] >= discovery[parent] and isWhite[parent] != "1" and 0 < whiteBelow[cell] < totalWhite:
+                        forced |= 1 << parent
+
+        if whiteBelow[root] < totalWhite:
+            return None
+        return forced
+
+
+    # Apply the rules until nothing changes. Returns the new (black, white) or None on a contradiction.
+    # probe=True also tries every cell of a string that still needs a black cell as black, and makes it
+    # white if that leads to a contradiction (failed-literal probing). This keeps the search tree tiny
+    def propagate(self, black, white, probe=True):
+        while True:
+            previous = (black, white)
+
+            white |= self.neighbours(black)     # Neighbours of black cells are white
+            if black & white:
+                return None
+
+            for mask, number in self.regionMasks:
+                blackCount = (black & mask).bit_count()
+                undecided = mask & ~black & ~white
+                undecidedCount = undecided.bit_count()
+                if blackCount > number or blackCount + undecidedCount < number:
+                    return None
+                if undecided:
+                    if blackCount == number:
+                        white |= undecided
+                    elif blackCount + undecidedCount == number:
+                        black |= undecided
+
+            for mask in self.runMasks:          # Every string spanning 3 regions needs a black cell
+                if not black & mask:
+                    undecided = mask & ~white
+                    if not undecided:
+                        return None
+                    if not undecided & (undecided - 1):
+                        black |= undecided
+
+            if black & white:
+                return None
+            if (black, white) != previous:
+                continue
+
+            # Connectivity is the most expensive rule, so it only runs once the others have settled
+            forced = self.cutVertices(black, white)
+            if forced is None:
+                return None
+            white |= forced
+            if (black, white) != previous:
+                continue
+
+            if probe:
+                for mask in self.runMasks:
+                    if black & mask:
+                        continue
+                    if self.shouldStop and self.shouldStop():   # Probing is slow, so stop with what is known so far
+                        return black, white
+                    undecided = mask & ~white
+                    while undecided:
+                        bit = undecided & -undecided
+                        undecided ^= bit
+                        if not bit & white and self.propagate(black | bit, white, probe=False) is None:
+                            white |= bit
+            if (black, white) == previous:
+                return black, white
+
+
+    # Pick the next cell to branch on: a cell of the string with the fewest undecided cells that still needs
+    # a black cell, preferring the cell shared with the most such strings. Any undecided cell once every string is satisfied
+    def chooseCell(self, black, white):
+        unsatisfied = [mask for mask in self.runMasks if not black & mask]
+        if not unsatisfied:
+            undecided = self.full & ~black & ~white
+            return undecided & -undecided
+
+        shortest = min((mask & ~white for mask in unsatisfied), key=int.bit_count)
+        counts = {}
+        for mask in unsatisfied:
+            common = mask & shortest
+            while common:
+                bit = common & -common
+                counts[bit] = counts.get(bit, 0) + 1
+                common ^= bit
+        return max(counts, key=counts.get)
+
+
+    # Depth-first search from a propagated state, with an explicit stack to avoid the recursion limit.
+    # Yields the black bitset of every solution in turn
+    def search(self, black, white):
+        stack = [(black, white)]
+        while stack:
+            black, white = stack.pop()
+            self.nodeCount += 1
+            if self.shouldStop and self.shouldStop():
+                print("Terminating")
+                self.stopped = True
+                return
+            if not self.full & ~black & ~white:
+                yield black
+                continue
+
+            # White is tried first: it leaves the most freedom for the rest of the grid.
+            # The stack is last in, first out, so the white branch is pushed last
+            bit = self.chooseCell(black, white)
+            for branchBlack, branchWhite in [(black | bit, white), (black, white | bit)]:
+                state = self.propagate(branchBlack, branchWhite)
+                if state:
+                    stack.append(state)
+
+
+    # Search for a solution with the cells in decided (cell: 1 if black, 0 if white) fixed.
+    # verifyUnique=True carries on searching for a second solution (see Solution.unique).
+    # profiler (see Profiler.py) times the propagation at the root and the search, and counts the search nodes.
+    # Options meant for other backends are ignored
+    def solve(self, decided, onSolution=None, onCut=None, shouldStop=None, verifyUnique=False, profiler=DISABLED, **options):
+        start = time.perf_counter()
+        self.nodeCount = 0
+        self.shouldStop = shouldStop
+        black = sum(self.bit[cell] for cell, colour in decided.items() if colour == 1)
+        white = sum(self.bit[cell] for cell, colour in decided.items() if colour == 0)
+        buildTime = time.perf_counter() - start
+
+        # Propagation at the root (probing especially) is most of the work, so it counts as runtime, not build time
+        with profiler.time("propagate"):
+            state = self.propagate(black, white)
+        self.stopped = False
+        solutions = self.search(*state) if state else iter([])
+        with profiler.time("search"):
+            result = next(solutions, None)
+            second = next(solutions, None) if verifyUnique and result is not None else None
+        profiler.count("nodes", self.nodeCount)
+        runtime = time.perf_counter() - start - buildTime
+
+        if result is None:
+            return Solution(False, runtime=runtime, buildTime=buildTime, nodeCount=self.nodeCount)
+        solution = Solution(True, self.shaded(result), runtime=runtime, buildTime=buildTime, nodeCount=self.nodeCount)
+        if verifyUnique and not self.stopped:
+            solution.unique = second is None
+            if second is not None:
+                solution.secondShaded = self.shaded(second)
+        if onSolution:
+            onSolution(solution.shaded)
+        return solution
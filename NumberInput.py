@@ -1,5 +1,6 @@
 import pygame
 from settings import *
+from glyphs import font
 
 class NumberInput:
     def __init__(self, x, y, width, height, xPos=None, yPos=None, defaultColour=GREY):
@@ -24,13 +25,15 @@ class NumberInput:
         self.inRegion = False
         self.inSolver = False
         self.fontSize = int(self.height/1.3)
-        self.font = pygame.font.SysFont("arial", self.fontSize, bold=1) 
+        self.font = font(self.fontSize)
         
         self.north = False
         self.east = False
         self.south = False
         self.west = False
         
+        self.drawnState = None      # Appearance when last drawn, to skip redrawing an unchanged input
+        
         self.updateFont()
     
     def update(self, mouse):
@@ -39,22 +42,31 @@ class NumberInput:
         else:
             self.isHighlighted = False
             
-    def draw(self, window):
+    # Draw the input if its appearance changed since it was last drawn, or always with force=True.
+    # Returns the rect that was drawn, or None
+    def draw(self, window, force=False):
         if self.isSelected:
-            self.image.fill(self.highlightedColour)
+            colour = self.highlightedColour
         elif self.isGrouped:
-            self.image.fill(self.groupedColour)
+            colour = self.groupedColour
         elif self.inSolver:
-            self.image.fill(self.defaultColour)
+            colour = self.defaultColour
         elif self.inRegion:
-            self.image.fill(self.regionColour)
+            colour = self.regionColour
         else:
-            self.image.fill(self.defaultColour)
+            colour = self.defaultColour
             
+        state = (colour, self.num, self.renderedFont)
+        if state == self.drawnState and not force:
+            return None
+        self.drawnState = state
+        
+        self.image.fill(colour)
         if self.num:
             self.drawText(self.num)
         
         window.blit(self.image, self.pos)
+        return self.rect
         
     def updateFont(self, textColour = BLACK):
         self.renderedFont = self.font.render(self.num, False, textColour)        
@@ -0,0 +1,199 @@
+import math
+from itertools import combinations
+
+
+# Raised when the deductions show that the puzzle has no solution
+class Contradiction(Exception):
+    pass
+
+
+
+# Logical deductions applied before the MIP. The local Heyawake rules are applied repeatedly
+# until none of them decides another cell:
+#  - regions with a 0 clue are all white and the neighbours of a black cell are white
+#  - the black cells of a clued region must be non-adjacent and must not wall off a cell (surround it on
+#    every side), so every placement of the remaining black cells is enumerated and cells that are
+#    black (or white) in all of them are decided. This covers region-count saturation and fixes e.g.
+#    the diagonal of a 2x2 corner region with clue 2 that leaves the corner cell white
+#  - a string of cells spanning 3 regions with a single undecided cell left must have it black
+#  - a cell whose shading would separate the white cells from each other must be white
+#  - a cell that would complete a wall or loop of black cells must be white
+class Presolver:
+    def __init__(self, solver, enumerationLimit=5000):
+        self.solver = solver
+        self.length = solver.length
+        self.runs = list(solver.vertRuns().values()) + list(solver.horRuns().values())
+        self.enumerationLimit = enumerationLimit    # Largest number of placements enumerated for one region
+        self.decided = {}                           # cell: 1 if black, 0 if white
+        self.changed = False
+
+
+    # Run the deductions to a fixpoint and return the decided cells. Raises Contradiction if the puzzle has no solution
+    def run(self):
+        for cells, number in self.solver.regions:
+            if number == 0:
+                for cell in cells:
+                    self.setCell(cell, 0)
+
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            self.regionRule()
+            self.runRule()
+            self.connectivityRule()
+            self.wallRule()
+        return self.decided
+
+
+    # Decide a cell. Black cells immediately make their neighbours white
+    def setCell(self, cell, colour):
+        if cell in self.decided:
+            if self.decided[cell] != colour:
+                raise Contradiction(f"cell {cell} must be both black and white")
+            return
+        self.decided[cell] = colour
+        self.changed = True
+        if colour == 1:
+            for neighbour in self.solver.cellNeigh(cell):
+                self.setCell(neighbour, 0)
+
+
+    def regionRule(self):
+        for cells, number in self.solver.regions:
+            if number < 0:
+                continue
+            undecided = [cell for cell in cells if cell not in self.decided]
+            need = number - sum(self.decided.get(cell) == 1 for cell in cells)
+            if need < 0 or need > len(undecided):
+                raise Contradiction(f"region containing {cells[0]} cannot hold {number} black cells")
+            if not undecided:
+                continue
+
+            if math.comb(len(undecided), need) > self.enumerationLimit:     # Too many placements, only check saturation
+                if need == len(undecided):
+                    for cell in undecided:
+                        self.setCell(cell, 1)
+                continue
+
+            black = {cell for cell, colour in self.decided.items() if colour == 1}
+            alwaysBlack = set(undecided)
+            neverBlack = set(undecided)
+            found = False
+            for placement in combinations(undecided, need):
+                chosen = set(placement)
+                if any(neighbour in chosen for cell in placement for neighbour in self.solver.cellNeigh(cell)):
+                    continue
+                if self.wallsOffCell(chosen, black):
+                    continue
+                found = True
+                alwaysBlack &= chosen
+                neverBlack -= chosen
+            if not found:
+                raise Contradiction(f"region containing {cells[0]} cannot hold {number} non-adjacent black cells")
+
+            for cell in alwaysBlack:
+                self.setCell(cell, 1)
+            for cell in neverBlack:
+                self.setCell(cell, 0)
+
+
+    # Whether shading the cells in chosen, on top of the black cells, would surround a cell with black cells
+    # on every side. Such a cell is white and cut off from the rest of the white cells
+    def wallsOffCell(self, chosen, black):
+        for cell in chosen:
+            for neighbour in self.solver.cellNeigh(cell):
+                if all(other in chosen or other in black for other in self.solver.cellNeigh(neighbour)):
+                    return True
+        return False
+
+
+    def runRule(self):
+        for run in self.runs:
+            if any(self.decided.get(cell) == 1 for cell in run):
+                continue
+            undecided = [cell for cell in run if cell not in self.decided]
+            if not undecided:
+                raise Contradiction(f"white cells from {run[0]} span 3 regions")
+            if len(undecided) == 1:
+                self.setCell(undecided[0], 1)
+
+
+    # The white cells must stay connected through cells that are not black. Any undecided cell that is
+    # a cut vertex of the non-black cells, separating white cells from each other, must itself be white.
+    # Found with an iterative Tarjan depth-first search that also counts the white cells below each cell
+    def connectivityRule(self):
+        discovery = {}
+        low = {}
+        whiteBelow = {}
+        totalWhite = sum(1 for colour in self.decided.values() if colour == 0)
+        mustBeWhite = set()
+        reachedWhite = 0
+
+        for root in self.solver.cells:
+            if root in discovery or self.decided.get(root) == 1:
+                continue
+            if reachedWhite and self.decided.get(root) == 0:
+                raise Contradiction(f"white cell {root} is cut off")
+
+            discovery[root] = low[root] = len(discovery)
+            whiteBelow[root] = int(self.decided.get(root) == 0)
+            stack = [(root, None, iter(self.solver.cellNeigh(root)))]
+            while stack:
+                cell, parent, neighbours = stack[-1]
+                for neighbour in neighbours:
+                    if self.decided.get(neighbour) == 1 or neighbour == parent:
+                        continue
+                    if neighbour in discovery:
+                        low[cell] = min(low[cell], discovery[neighbour])
+                    else:
+                        discovery[neighbour] = low[neighbour] = len(discovery)
+                        whiteBelow[neighbour] = int(self.decided.get(neighbour) == 0)
+                        stack.append((neighbour, cell, iter(self.solver.cellNeigh(neighbour))))
+                        break
+                else:
+                    stack.pop()
+                    if parent is not None:
+                        low[parent] = min(low[parent], low[cell])
+                        whiteBelow[parent] += whiteBelow[cell]
+                        # Removing parent separates the subtree below cell from the rest
+                        if low[cell] >= discovery[parent] and parent not in self.decided:
+                            if 0 < whiteBelow[cell] < totalWhite:
+                                mustBeWhite.add(parent)
+            reachedWhite += whiteBelow[root]
+
+        for cell in mustBeWhite:
+            self.setCell(cell, 0)
+
+
+    def wallRule(self):
+        black = [self.decided.get(cell) == 1 for cell in self.solver.cells]
+        walls, loops = self.solver.findWallsAndLoops(black)
+        if walls or loops:
+            raise Contradiction("the black cells already form a wall or loop")
+
+        # Label the diagonally connected components of black cells and count their boundary cells
+        component = {}
+        boundaryCells = []
+        for k, isBlack in enumerate(black):
+            if isBlack and k not in component:
+                component[k] = len(boundaryCells)
+                stack = [k]
+                boundary = 0
+                while stack:
+                    kk = stack.pop()
+                    boundary += self.solver.isBoundary[kk]
+                    for kkk in self.solver.diagonalTable[kk]:
+                        if black[kkk] and kkk not in component:
+                            component[kkk] = component[k]
+                            stack.append(kkk)
+                boundaryCells.append(boundary)
+
+        for k, cell in enumerate(self.solver.cells):
+            if cell in self.decided:
+                continue
+            touching = [component[kk] for kk in self.solver.diagonalTable[k] if black[kk]]
+            joined = set(touching)
+            if len(joined) < len(touching):       # Two neighbours in the same component: black here closes a loop
+                self.setCell(cell, 0)
+            elif self.solver.isBoundary[k] + sum(boundaryCells[c] for c in joined) > 1:     # Black here links two boundary cells
+                self.setCell(cell, 0)
@@ -0,0 +1,85 @@
+import contextlib, json, math, time
+
+
+# Collects timings of named sections of the solver, plus event counters. Section names are paths separated
+# by ";" (e.g. "optimize;callback;wall"), so nested sections export directly as flamegraph folded stacks.
+# For every section it keeps the number of calls, the total time and a histogram of call durations
+# in power-of-two microsecond buckets. A disabled Profiler records nothing and costs almost nothing
+class Profiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.sections = {}      # name: {"count": calls, "total": seconds, "histogram": {bucket: calls}}
+        self.counters = {}      # name: count
+
+
+    # Time the body of a with statement as section name
+    def time(self, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self.timing(name)
+
+    @contextlib.contextmanager
+    def timing(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        section = self.sections.setdefault(name, {"count": 0, "total": 0.0, "histogram": {}})
+        section["count"] += 1
+        section["total"] += seconds
+        # Bucket k holds the calls that took up to 2^k microseconds
+        bucket = str(max(0, math.ceil(math.log2(max(seconds*1e6, 1)))))
+        section["histogram"][bucket] = section["histogram"].get(bucket, 0) + 1
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+    # Add the sections and counters of another profile, as returned by toDict (e.g. from a worker process)
+    def merge(self, data):
+        for name, other in data["sections"].items():
+            section = self.sections.setdefault(name, {"count": 0, "total": 0.0, "histogram": {}})
+            section["count"] += other["count"]
+            section["total"] += other["total"]
+            for bucket, calls in other["histogram"].items():
+                section["histogram"][bucket] = section["histogram"].get(bucket, 0) + calls
+        for name, n in data["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def toDict(self):
+        return {"sections": self.sections, "counters": self.counters}
+
+
+    # The time spent in a section itself, excluding the sections nested directly inside it
+    def selfTime(self, name):
+        children = [section["total"] for child, section in self.sections.items()
+                    if child.startswith(name + ";") and ";" not in child[len(name)+1:]]
+        return max(0.0, self.sections[name]["total"] - sum(children))
+
+    # Folded stacks ("optimize;callback;wall 1234" per line, in microseconds of self time), as read by flamegraph.pl and speedscope
+    def toFolded(self):
+        return "".join(f"{name} {round(self.selfTime(name)*1e6)}\n" for name in sorted(self.sections))
+
+    # Write the profile as JSON, or as folded stacks if the path ends in .folded
+    def write(self, path):
+        with open(path, "w") as filehandle:
+            if path.endswith(".folded"):
+                filehandle.write(self.toFolded())
+            else:
+                json.dump(self.toDict(), filehandle, indent=2)
+
+    # One line per section, slowest first
+    def summary(self):
+        lines = []
+        for name, section in sorted(self.sections.items(), key=lambda item: -item[1]["total"]):
+            lines.append(f"{name:<32}{section['count']:>8} calls {section['total']*1000:>10.2f} ms "
+                         f"{section['total']/section['count']*1e6:>10.1f} us/call")
+        lines.extend(f"{name:<32}{n:>8}" for name, n in sorted(self.counters.items()))
+        return "\n".join(lines)
+
+
+DISABLED = Profiler(enabled=False)      # Default for code that takes an optional profiler
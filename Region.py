@@ -13,11 +13,12 @@ class Region:
         return [(gridInput.xPos, gridInput.yPos) for gridInput in self.gridInputs]
     
     def groupGridInputs(self):
-        cells = self.getPos()
+        cells = set(self.getPos())
         for gridInput in self.gridInputs:
             gridInput.isLocked = False
             gridInput.isGrouped = 0
             gridInput.inRegion = True
+            gridInput.region = self
             
             x,y = gridInput.getPos()
             if (x-1,y) not in cells:
@@ -0,0 +1,94 @@
+import hashlib, json, sqlite3, time
+from Solver import Solution
+
+
+DEFAULT_PATH = "solution_cache.sqlite"
+
+
+# Persistent cache of solutions in an SQLite file, keyed by a canonical hash of the puzzle layout.
+# Rotating or mirroring a puzzle doesn't change its key: the layout is hashed in whichever of the
+# 8 symmetries of the square gives the smallest encoding, and solutions are stored in that orientation.
+# When the cache holds more than maxEntries solutions the least recently used ones are evicted
+class SolutionCache:
+    def __init__(self, path=DEFAULT_PATH, maxEntries=100000):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.connection = sqlite3.connect(path, timeout=30)     # Batch workers share the file, so wait for their locks
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, solution TEXT, lastUsed REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS lastUsed ON solutions (lastUsed)")
+        self.connection.commit()
+
+
+    # The 8 symmetries of an n x n grid, as functions of a cell
+    @staticmethod
+    def symmetries(n):
+        return [lambda i, j: (i, j),         lambda i, j: (n-1-i, j),
+                lambda i, j: (i, n-1-j),     lambda i, j: (n-1-i, n-1-j),
+                lambda i, j: (j, i),         lambda i, j: (n-1-j, i),
+                lambda i, j: (j, n-1-i),     lambda i, j: (n-1-j, n-1-i)]
+
+    # Encode the layout of a Solver's puzzle as seen through a symmetry. Regions are renumbered in the order
+    # they are first met, so the encoding doesn't depend on the order the regions were entered in.
+    # Where a clue sits inside its region doesn't matter to the solution, so only the clue of each region is kept
+    def encode(self, solver, symmetry):
+        n = solver.length
+        transformed = [0]*(n*n)
+        for (i,j) in solver.cells:
+            ii, jj = symmetry(i, j)
+            transformed[ii*n + jj] = solver.regionId[i][j]
+
+        renumbered = {}
+        for r in transformed:
+            if r not in renumbered:
+                renumbered[r] = len(renumbered)
+        ids = [renumbered[r] for r in transformed]
+        clues = [0]*len(renumbered)
+        for r, new in renumbered.items():
+            clues[new] = solver.regions[r][1]
+        return json.dumps([n, ids, clues], separators=(",", ":"))
+
+    # The cache key of a Solver's puzzle and the symmetry taking the puzzle to its canonical orientation
+    def canonical(self, solver):
+        encodings = [(self.encode(solver, symmetry), k) for k, symmetry in enumerate(self.symmetries(solver.length))]
+        encoding, k = min(encodings)
+        return hashlib.sha256(encoding.encode()).hexdigest(), self.symmetries(solver.length)[k]
+
+
+    # Return the cached Solution for a Solver's puzzle in its own orientation, or None.
+    # With verifyUnique, a solution cached without a uniqueness check counts as a miss
+    def get(self, solver, verifyUnique=False):
+        key, symmetry = self.canonical(solver)
+        row = self.connection.execute("SELECT solution FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        stored = json.loads(row[0])
+        if verifyUnique and stored["unique"] is None:
+            return None
+        self.connection.execute("UPDATE solutions SET lastUsed = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+
+        # Map the stored cells back through the inverse of the symmetry
+        inverse = {symmetry(i, j): (i, j) for (i,j) in solver.cells}
+        solution = Solution(True, {inverse[tuple(cell)] for cell in stored["shaded"]}, cached=True)
+        if verifyUnique:
+            solution.unique = stored["unique"]
+            if stored["secondShaded"]:
+                solution.secondShaded = {inverse[tuple(cell)] for cell in stored["secondShaded"]}
+        return solution
+
+    # Store a solved Solution for a Solver's puzzle, evicting the least recently used solutions beyond maxEntries
+    def put(self, solver, solution):
+        key, symmetry = self.canonical(solver)
+        stored = {"shaded": sorted(symmetry(i, j) for (i,j) in solution.shaded),
+                  "unique": solution.unique,
+                  "secondShaded": sorted(symmetry(i, j) for (i,j) in solution.secondShaded) if solution.secondShaded else None}
+        self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)", (key, json.dumps(stored), time.time()))
+        self.connection.execute("DELETE FROM solutions WHERE key IN (SELECT key FROM solutions ORDER BY lastUsed DESC LIMIT -1 OFFSET ?)",
+                                (self.maxEntries,))
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,461 @@
+import heapq, importlib.util, time
+from collections import deque
+from Presolver import Presolver, Contradiction
+from Profiler import DISABLED
+
+
+BACKENDS = ["gurobi", "native"]
+
+
+# Return the backend class for a backend name. Backends are imported on first use,
+# so gurobipy is only needed when the Gurobi backend is actually chosen
+def getBackend(name):
+    if name == "gurobi":
+        from GurobiBackend import GurobiBackend
+        return GurobiBackend
+    if name == "native":
+        from NativeBackend import NativeBackend
+        return NativeBackend
+    raise ValueError(f"Unknown backend {name}, expected one of {BACKENDS}")
+
+# Backends whose dependencies are installed
+def availableBackends():
+    return [name for name in BACKENDS if name != "gurobi" or importlib.util.find_spec("gurobipy")]
+
+# Gurobi if it is installed, otherwise the pure-Python search
+def defaultBackend():
+    return availableBackends()[0]
+
+
+# Neighbours of every cell of an n x n grid as per-cell tuples, cell (i,j) being k = i*length + j: rows[k] holds the
+# neighbours of k as indices and cells[k] the same neighbours as (i,j) cells, so loops in Python iterate over them
+# without allocating
+class NeighbourTable:
+    def __init__(self, length, steps):
+        self.rows = tuple(tuple((i+di)*length + j+dj for di, dj in steps if 0 <= i+di < length and 0 <= j+dj < length)
+                          for i in range(length) for j in range(length))
+        self.cells = tuple(tuple(divmod(kk, length) for kk in row) for row in self.rows)
+
+
+# Orthogonal and diagonal neighbour tables and boundary flags for a grid size. They depend on nothing but
+# the size, so they are built once per length (see gridTable) and shared by every solver, backend and presolve
+class GridTables:
+    def __init__(self, length):
+        self.orthogonal = NeighbourTable(length, [(-1, 0), (0, 1), (1, 0), (0, -1)])
+        self.diagonal = NeighbourTable(length, [(-1, -1), (-1, 1), (1, 1), (1, -1)])
+        self.isBoundary = bytearray(i in [0, length-1] or j in [0, length-1] for i in range(length) for j in range(length))
+
+
+gridTables = {}     # GridTables built by gridTable, by length
+
+def gridTable(length):
+    if length not in gridTables:
+        gridTables[length] = GridTables(length)
+    return gridTables[length]
+
+
+# Outcome of a solve. shaded is the set of black cells, or None if no solution was found
+class Solution:
+    def __init__(self, solved, shaded=None, runtime=0.0, lazyConstraintsAdded=0,
+                 buildTime=0.0, callbackCount=0, callbackTime=0.0, nodeCount=0, lpBound=None,
+                 presolveTime=0.0, cellsDecided=0, unique=None, secondShaded=None, cached=False, userCutsAdded=0):
+        self.solved = solved
+        self.shaded = shaded
+        self.runtime = runtime                              # Solver runtime in seconds
+        self.lazyConstraintsAdded = lazyConstraintsAdded    # Walls/loops cut off by the callback (Gurobi backend)
+        self.buildTime = buildTime                          # Model construction time in seconds
+        self.callbackCount = callbackCount                  # Number of incumbents checked by the callback (Gurobi backend)
+        self.callbackTime = callbackTime                    # Time spent in the callback in seconds (Gurobi backend)
+        self.nodeCount = nodeCount                          # Branch-and-bound or search nodes explored
+        self.lpBound = lpBound                              # Most black cells allowed by the LP relaxation, if measured
+        self.presolveTime = presolveTime                    # Logical deduction time in seconds
+        self.cellsDecided = cellsDecided                    # Cells decided by logical deduction before the backend ran
+        self.unique = unique                                # With verifyUnique, True if shaded is the only solution, False if
+                                                            # secondShaded is another one, None if not checked or not finished
+        self.secondShaded = secondShaded
+        self.cached = cached                                # True if the solution came from a SolutionCache
+        self.userCutsAdded = userCutsAdded                  # Walls/loops separated from LP relaxations (Gurobi backend)
+
+
+
+# Headless Heyawake solver. Takes the puzzle description that puzzlefile.loadPuzzle returns:
+# {"length": n, "regions": [{(i,j): number or None, ...}, ...]}
+class Solver:
+    def __init__(self, information):
+        self.length = information["length"]
+        self.regions = []       # List of (cells, number) tuples. number is -1 if the region has no clue
+        for region in information["regions"]:
+            number = -1
+            for cell, num in region.items():
+                if num:
+                    number = int(num)
+            self.regions.append((list(region.keys()), number))
+
+        self.cells = [(i,j) for i in range(self.length) for j in range(self.length)]
+
+        # Index of the region containing each cell, built once per puzzle
+        self.regionId = [[-1]*self.length for i in range(self.length)]
+        for r, (cells, number) in enumerate(self.regions):
+            for (i,j) in cells:
+                self.regionId[i][j] = r
+
+        # Neighbour tables and boundary flags, indexed by i*length + j and shared between puzzles of the same size
+        self.tables = gridTable(self.length)
+        self.orthogonalTable = self.tables.orthogonal.rows
+        self.diagonalTable = self.tables.diagonal.rows
+        self.isBoundary = self.tables.isBoundary
+
+
+
+###### HELPER FUNCTIONS ######
+
+    # Return all orthogonal neighbours of a cell, as a shared tuple from the neighbour table
+    def cellNeigh(self, cell):
+        return self.tables.orthogonal.cells[cell[0]*self.length + cell[1]]
+
+    # Return all diagonal neighbours of a cell, as a shared tuple from the neighbour table
+    def diagonalNeighbours(self, cell):
+        return self.tables.diagonal.cells[cell[0]*self.length + cell[1]]
+
+
+    # Sweep along a line of cells. For every cell whose next cell lies in a different region (or off the grid),
+    # collect the string of cells starting there that first spans 3 distinct regions. The end of the string
+    # never moves backwards as the start advances, so the sweep is linear in the length of the line.
+    # Returns a dictionary of start cell: string of cells
+    def threeRegionRuns(self, line):
+        ids = [self.regionId[i][j] for (i,j) in line]
+        runs = {}
+        counts = {}     # Number of cells of each region in line[start:end]
+        end = 0
+        for start in range(len(line)):
+            if start > 0:
+                counts[ids[start-1]] -= 1
+                if not counts[ids[start-1]]:
+                    del counts[ids[start-1]]
+            while end < len(line) and len(counts) < 3:
+                counts[ids[end]] = counts.get(ids[end], 0) + 1
+                end += 1
+            if len(counts) < 3:     # No string from here onwards reaches a third region
+                break
+            if start == len(line)-1 or ids[start+1] != ids[start]:
+                runs[line[start]] = line[start:end]
+        return runs
+
+    # Strings of cells running south that span exactly 3 regions, keyed by their first cell
+    def vertRuns(self):
+        runs = {}
+        for i in range(self.length):
+            runs.update(self.threeRegionRuns([(i,j) for j in range(self.length)]))
+        return runs
+
+    # Strings of cells running east that span exactly 3 regions, keyed by their first cell
+    def horRuns(self):
+        runs = {}
+        for j in range(self.length):
+            runs.update(self.threeRegionRuns([(i,j) for i in range(self.length)]))
+        return runs
+
+
+
+    # Check a complete shading against every rule of the puzzle
+    def checkSolution(self, shaded):
+        for (i,j) in shaded:
+            if shaded.intersection(self.cellNeigh((i,j))):
+                return False
+        for cells, number in self.regions:
+            if number >= 0 and len(shaded.intersection(cells)) != number:
+                return False
+        for run in list(self.vertRuns().values()) + list(self.horRuns().values()):
+            if shaded.isdisjoint(run):
+                return False
+
+        whiteCells = [cell for cell in self.cells if cell not in shaded]
+        reached = {whiteCells[0]}
+        queue = deque(reached)
+        while queue:
+            for neighbour in self.cellNeigh(queue.popleft()):
+                if neighbour not in shaded and neighbour not in reached:
+                    reached.add(neighbour)
+                    queue.append(neighbour)
+        return len(reached) == len(whiteCells)
+
+
+
+###### SOLVER HELPER FUNCTIONS ######
+
+    # Group the black cells into diagonally connected components with an array-backed disjoint set,
+    # in a single pass over the grid. Returns every component that touches the boundary at least twice
+    # (contains an impenetrable wall) as a list of cells, and every component that contains a cycle (a loop)
+    # as (cells, closing): closing holds the diagonal edges (k, kk) that joined two cells already connected,
+    # one for each independent cycle of the component (see shortestLoops)
+    def findWallsAndLoops(self, black):
+        parent = list(range(len(black)))
+        closing = []        # Edges that closed a cycle, as (k, kk) cell indices
+
+        def find(k):
+            while parent[k] != k:
+                parent[k] = parent[parent[k]]
+                k = parent[k]
+            return k
+
+        for k, isBlack in enumerate(black):
+            if isBlack:
+                for kk in self.diagonalTable[k]:
+                    if kk > k and black[kk]:   # Visit each diagonal edge once
+                        a, b = find(k), find(kk)
+                        if a == b:             # Both ends already connected, so this edge closes a cycle
+                            closing.append((k, kk))
+                        else:
+                            if b < a:
+                                a, b = b, a
+                            parent[b] = a
+
+        components = {}
+        for k, isBlack in enumerate(black):
+            if isBlack:
+                components.setdefault(find(k), []).append(k)
+        cycles = {}         # Closing edges of each component, by root
+        for k, kk in closing:
+            cycles.setdefault(find(k), []).append((k, kk))
+
+        walls = []
+        loops = []
+        for root, component in components.items():
+            cells = [divmod(k, self.length) for k in component]
+            if sum(self.isBoundary[k] for k in component) > 1:
+                walls.append(cells)
+            if root in cycles:
+                loops.append((cells, cycles[root]))
+        return walls, loops
+
+    # Breadth-first search over the diagonal neighbours within component (a set of cell indices) from start.
+    # Cells for which stop(k) is True are reached but not searched past, and the edge from start to avoid is not used.
+    # Returns {cell: previous cell on a shortest path from start}, start having previous -1
+    def diagonalPaths(self, component, start, stop=None, avoid=-1):
+        previous = {start: -1}
+        queue = deque([start])
+        while queue:
+            k = queue.popleft()
+            if k != start and stop and stop(k):
+                continue
+            for kk in self.diagonalTable[k]:
+                if kk in component and kk not in previous and not (k == start and kk == avoid):
+                    previous[kk] = k
+                    queue.append(kk)
+        return previous
+
+    # The cells on the path to k found by diagonalPaths, from k back to the start
+    def tracePath(self, previous, k):
+        path = []
+        while k >= 0:
+            path.append(divmod(k, self.length))
+            k = previous[k]
+        return path
+
+    # The shortest wall between every pair of boundary cells of a wall component that are joined without passing
+    # through a third one (a wall through a third boundary cell contains a shorter wall). Each is found by a
+    # breadth-first search from one of the pair, so it has no trails to purge. Returns the walls as lists of cells
+    def shortestWalls(self, cells):
+        component = {i*self.length + j for (i,j) in cells}
+        ends = sorted(k for k in component if self.isBoundary[k])
+        walls = []
+        for start in ends:
+            previous = self.diagonalPaths(component, start, stop=self.isBoundary.__getitem__)
+            walls.extend(self.tracePath(previous, end) for end in ends if end > start and end in previous)
+        return walls
+
+    # The shortest cycle through each closing edge (k, kk) of a loop component (see findWallsAndLoops): the
+    # shortest path from k to kk that doesn't use the edge itself. A component with several cycles, such as two
+    # loops joined by a path, gives a cut for each rather than one cut over all of them. Returns lists of cells
+    def shortestLoops(self, cells, closing):
+        component = {i*self.length + j for (i,j) in cells}
+        return [self.tracePath(self.diagonalPaths(component, k, avoid=kk), kk) for k, kk in closing]
+
+
+    # Separate walls and loops from a fractional solution, values[k] being the LP value of X at cell k = i*length + j.
+    # A wall or loop of cells P is cut off by sum(X[P]) <= len(P) - 1, which the LP solution violates exactly when
+    # the cells of P have summed weight 1 - values[k] below 1. So walls come from a shortest path search over the
+    # diagonal grid graph with these node weights, started from every boundary cell at once, and loops from a shortest
+    # cycle search through each cell that is more than half black (a violated loop has at most one cell that isn't).
+    # Only cells with a positive LP value can be on a violated path, so the searches stay within them.
+    # Each loop search is a Dijkstra of its own, so at most maxStarts cells are tried as a start, and no more
+    # once timeLimit seconds have passed (None for no limit).
+    # Returns the violated walls and loops as lists of cells, at most one wall for each pair of boundary cells
+    def fractionalWallsAndLoops(self, values, tolerance=1e-4, maxStarts=None, timeLimit=None):
+        deadline = None if timeLimit is None else time.perf_counter() + timeLimit
+        weight = [1 - value for value in values]
+        inSupport = bytearray(value > tolerance for value in values)
+
+        # Dijkstra from the cells in starts, within the support. Returns {cell: (distance, parent)} in the order
+        # the cells were reached, distances counting the weights of both end cells. Start cells have parent -1
+        def shortestPaths(starts):
+            reached = {}
+            heap = [(weight[k], k, -1) for k in starts]
+            heapq.heapify(heap)
+            while heap:
+                d, k, parent = heapq.heappop(heap)
+                if k in reached:
+                    continue
+                reached[k] = (d, parent)
+                for kk in self.diagonalTable[k]:
+                    if inSupport[kk] and kk not in reached:
+                        heapq.heappush(heap, (d + weight[kk], kk, k))
+            return reached
+
+        def path(reached, k):
+            cells = []
+            while k >= 0:
+                cells.append(k)
+                k = reached[k][1]
+            return cells
+
+        cuts = {}
+        reached = shortestPaths([k for k in range(len(values)) if inSupport[k] and self.isBoundary[k]])
+        origin = {}     # The boundary cell each path starts from
+        for k, (d, parent) in reached.items():
+            origin[k] = k if parent < 0 else origin[parent]
+        lightest = {}   # (boundary cell, boundary cell): (weight, k, kk) of the lightest wall between them, through edge k-kk
+        for k in reached:
+            for kk in self.diagonalTable[k]:
+                if kk > k and kk in reached and origin[k] != origin[kk]:
+                    ends = tuple(sorted((origin[k], origin[kk])))
+                    total = reached[k][0] + reached[kk][0]
+                    if total < 1 - tolerance and total < lightest.get(ends, (1,))[0]:
+                        lightest[ends] = (total, k, kk)
+        for total, k, kk in lightest.values():
+            cells = path(reached, k)[::-1] + path(reached, kk)
+            cuts.setdefault(tuple(sorted(cells)), cells)
+
+        covered = set()
+        tried = 0
+        for start in sorted((k for k in range(len(values)) if values[k] > 0.5), key=lambda k: -values[k]):
+            if start in covered:
+                continue
+            if tried == maxStarts or (deadline is not None and time.perf_counter() >= deadline):
+                break
+            tried += 1
+            reached = shortestPaths([start])
+            branch = {}     # The cell after start on the path to each cell. An edge between two branches closes a cycle through start
+            for k, (d, parent) in reached.items():
+                if parent >= 0:
+                    branch[k] = k if parent == start else branch[parent]
+            best = None
+            for k in branch:
+                for kk in self.diagonalTable[k]:
+                    if kk > k and kk in branch and branch[kk] != branch[k]:
+                        total = reached[k][0] + reached[kk][0] - weight[start]
+                        if total < 1 - tolerance and (best is None or total < best[0]):
+                            best = (total, k, kk)
+            if best:
+                cells = path(reached, best[1]) + path(reached, best[2])[-2::-1]
+                covered.update(cells)
+                cuts.setdefault(tuple(sorted(cells)), cells)
+
+        return [[divmod(k, self.length) for k in cells] for cells in cuts.values()]
+
+
+    # "Chop off" any tails on a loop component and return the remaining cells, every one of which lies on a cycle
+    # or on a path between two cycles. The cycles are then looked for in these cells only (see shortestLoops).
+    # Walls need no purging, since shortestWalls only follows shortest paths between boundary cells.
+    # Endpoints (cells with a single diagonal neighbour left) are peeled off a queue, and removing one lowers the
+    # count of its neighbour, which joins the queue once it becomes an endpoint itself. So every cell is
+    # handled a bounded number of times, in time linear in the size of the component
+    def purgeTrails(self, cells):
+        degree = {i*self.length + j: 0 for (i,j) in cells}     # Diagonal neighbours of each cell still in the component
+        for k in degree:
+            for kk in self.diagonalTable[k]:
+                if kk in degree:
+                    degree[k] += 1
+
+        queue = deque(k for k in degree if degree[k] == 1)
+        removed = set()
+        while queue:
+            k = queue.popleft()
+            if k in removed or degree[k] != 1:
+                continue
+            removed.add(k)
+            for kk in self.diagonalTable[k]:
+                if kk in degree and kk not in removed:
+                    degree[kk] -= 1
+                    if degree[kk] == 1:
+                        queue.append(kk)
+        return [(i,j) for (i,j) in cells if i*self.length + j not in removed]
+
+
+
+###### SOLVER ######
+
+    # Solve the puzzle with the chosen backend and return a Solution.
+    # backend is a backend name, or a backend object already set up for this puzzle (see Session).
+    # onSolution(shaded) is called with every (candidate) solution found,
+    # onCut(kind, trail, core) is called for every wall ("wall") or loop ("loop") cut, with the component it was found in and its cells,
+    # shouldStop() is polled during the solve and terminates it when it returns True.
+    # presolve=True fixes every cell that the Presolver can deduce before the backend runs.
+    # verifyUnique=True also checks whether the solution is the only one (see Solution.unique).
+    # cache is a SolutionCache to look the puzzle up in first, and to store a new solution in.
+    # profiler is a Profiler (see Profiler.py) that times the presolve and the backend's work.
+    # Any other options are passed on to the backend's solve
+    def solve(self, backend=None, onSolution=None, onCut=None, shouldStop=None, presolve=True, verifyUnique=False, cache=None,
+              profiler=DISABLED, **options):
+        if cache is not None:
+            solution = cache.get(self, verifyUnique)
+            if solution:
+                if onSolution:
+                    onSolution(solution.shaded)
+                return solution
+
+        solution = self.solveUncached(backend, onSolution, onCut, shouldStop, presolve, verifyUnique, profiler=profiler, **options)
+        if cache is not None and solution.solved:
+            cache.put(self, solution)
+        return solution
+
+    # Presolve, then hand whatever is left to the backend
+    def solveUncached(self, backend, onSolution, onCut, shouldStop, presolve, verifyUnique, profiler=DISABLED, **options):
+        decided = {}
+        presolveStart = time.perf_counter()
+        if presolve:
+            try:
+                decided = Presolver(self).run()
+            except Contradiction:
+                return Solution(False, presolveTime=time.perf_counter() - presolveStart)
+        presolveTime = time.perf_counter() - presolveStart
+        if profiler.enabled:
+            profiler.record("presolve", presolveTime)
+
+        # Every cell was deduced, so there is nothing left for the backend to do.
+        # The deductions follow from the rules, so the solution is also unique
+        if len(decided) == len(self.cells):
+            shaded = {cell for cell, colour in decided.items() if colour == 1}
+            if not self.checkSolution(shaded):
+                return Solution(False, presolveTime=presolveTime, cellsDecided=len(decided))
+            if onSolution:
+                onSolution(shaded)
+            return Solution(True, shaded, presolveTime=presolveTime, cellsDecided=len(decided), unique=True if verifyUnique else None)
+
+        if backend is None or isinstance(backend, str):
+            backend = getBackend(backend or defaultBackend())(self)
+        solution = backend.solve(decided, onSolution=onSolution, onCut=onCut, shouldStop=shouldStop, verifyUnique=verifyUnique,
+                                  profiler=profiler, **options)
+        solution.presolveTime = presolveTime
+        solution.cellsDecided = len(decided)
+        return solution
+
+
+
+# Solves a puzzle repeatedly while it is being edited. The backend is kept between solves and told about
+# the edited puzzle with its update method, so the Gurobi backend only replaces the constraints of the
+# regions and clues that changed and keeps its wall/loop cuts and last solution
+class Session:
+    def __init__(self):
+        self.backendName = None
+        self.backend = None
+
+
+    # Solve an edited version of the puzzle. Takes the same arguments as Solver.solve
+    def solve(self, information, backend=None, **options):
+        solver = Solver(information)
+        backendName = backend or defaultBackend()
+        if self.backend is None or backendName != self.backendName or not self.backend.update(solver):
+            self.backend = getBackend(backendName)(solver)
+            self.backendName = backendName
+        return solver.solve(self.backend, **options)
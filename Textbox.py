@@ -1,10 +1,11 @@
 import pygame
 from settings import *
+from glyphs import font
 
 class Textbox:
     def __init__(self, x, y, width, height, text=None):
         self.image = pygame.Surface((width, height))
-        self.font = pygame.font.SysFont("arial", 25, bold=1)
+        self.font = font(25)
         self.renderedText = None
         self.pos = (x, y)
         self.rect = self.image.get_rect()
@@ -13,15 +14,24 @@ class Textbox:
         self.colour = BLUE
         self.width = width
         self.height = height
+        self.drawnState = None      # Appearance when last drawn, to skip redrawing an unchanged textbox
         
         self.updateFont()
         
     
-    def draw(self, window):
+    # Draw the textbox if its appearance changed since it was last drawn, or always with force=True.
+    # Returns the rect that was drawn, or None
+    def draw(self, window, force=False):
+        state = (self.colour, self.text, self.renderedText)
+        if state == self.drawnState and not force:
+            return None
+        self.drawnState = state
+
         self.image.fill(self.colour)
         if self.text:
             self.drawText(self.text)
         window.blit(self.image, self.pos)
+        return self.rect
         
     def updateFont(self):      
         self.renderedText = self.font.render(self.text, False, BLACK)        
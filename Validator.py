@@ -0,0 +1,102 @@
+import numpy as np
+
+
+# Independent check of shadings against the rules of a puzzle, evaluated with NumPy over whole batches at once.
+# Shadings are stacked into a boolean array of shape (batch, length, length), True for black cells,
+# so thousands of solver outputs or cached solutions for a puzzle are checked in a handful of array operations.
+# Needs numpy, which the solver itself doesn't
+class Validator:
+    def __init__(self, solver):
+        self.solver = solver
+        self.length = solver.length
+        self.regionIds = np.array(solver.regionId, dtype=np.intp).ravel()      # Region of cell i*length + j
+        self.clues = np.array([number for cells, number in solver.regions], dtype=np.int64)
+
+
+    # Stack shaded sets of cells into a boolean array of shape (len(shadeds), length, length)
+    def toArray(self, shadeds):
+        shadings = np.zeros((len(shadeds), self.length, self.length), dtype=bool)
+        for b, shaded in enumerate(shadeds):
+            if shaded:
+                i, j = zip(*shaded)
+                shadings[b, list(i), list(j)] = True
+        return shadings
+
+
+    # No two black cells orthogonally adjacent: AND each grid with itself shifted by one cell
+    def checkAdjacent(self, shadings):
+        return ~((shadings[:, 1:, :] & shadings[:, :-1, :]).any(axis=(1, 2)) |
+                 (shadings[:, :, 1:] & shadings[:, :, :-1]).any(axis=(1, 2)))
+
+    # Every clued region holds exactly its number of black cells, counted by one bincount over (shading, region) ids
+    def checkRegions(self, shadings):
+        batch, regionCount = len(shadings), len(self.clues)
+        ids = (np.arange(batch)[:, None]*regionCount + self.regionIds[None, :]).ravel()
+        counts = np.bincount(ids, weights=shadings.reshape(batch, -1).ravel(), minlength=batch*regionCount).reshape(batch, regionCount)
+        clued = self.clues >= 0
+        return (counts[:, clued] == self.clues[clued]).all(axis=1)
+
+    # No string of white cells along a row or column spans 3 regions. Worked out from the region ids alone rather than
+    # from the solver's strings (Solver.threeRegionRuns), so that a mistake there can't slip past both
+    def checkRuns(self, shadings):
+        regions = self.regionIds.reshape(self.length, self.length)
+        return (self.checkWhiteStrings(~shadings, regions) &
+                self.checkWhiteStrings(~shadings.transpose(0, 2, 1), regions.T))
+
+    # Whether every maximal string of white cells along the rows of white holds cells of at most 2 distinct regions,
+    # regions being the region id of each cell. In row-major order the white cells of each string are consecutive,
+    # so the strings of all shadings are reduced at once with reduceat. A string spans 3 regions exactly when its
+    # cells outside the region of its first cell don't all share one region
+    def checkWhiteStrings(self, white, regions):
+        valid = np.ones(len(white), dtype=bool)
+        starts = white.copy()
+        starts[:, :, 1:] &= ~white[:, :, :-1]
+        isWhite = white.ravel()
+        whiteCells = np.flatnonzero(isWhite)
+        region = np.broadcast_to(regions, white.shape).ravel()[isWhite]     # Region of each white cell
+        starts = starts.ravel()[isWhite]
+        bounds = np.flatnonzero(starts)                                     # First white cell of each string
+        if not len(bounds):
+            return valid
+        string = np.cumsum(starts) - 1                                      # String of each white cell
+        other = region != region[bounds][string]
+        lowest = np.minimum.reduceat(np.where(other, region, len(self.clues)), bounds)
+        highest = np.maximum.reduceat(np.where(other, region, -1), bounds)
+        valid[whiteCells[bounds[lowest < highest]] // (self.length*self.length)] = False
+        return valid
+
+    # The white cells of each shading form one orthogonally connected area. Labelled by flooding from the first
+    # white cell of every shading at once, one step in all four directions per iteration until nothing changes.
+    # A wall or loop of black cells always separates white cells (the cells beside a black cell are white),
+    # so this is also the check for walls and loops
+    def checkConnected(self, shadings):
+        white = ~shadings
+        batch = len(shadings)
+        flatWhite = white.reshape(batch, -1)
+        reached = np.zeros_like(white)
+        first = flatWhite.argmax(axis=1)
+        reached.reshape(batch, -1)[np.arange(batch), first] = flatWhite[np.arange(batch), first]
+        while True:
+            grown = reached.copy()
+            grown[:, 1:, :] |= reached[:, :-1, :]
+            grown[:, :-1, :] |= reached[:, 1:, :]
+            grown[:, :, 1:] |= reached[:, :, :-1]
+            grown[:, :, :-1] |= reached[:, :, 1:]
+            grown &= white
+            if np.array_equal(grown, reached):
+                break
+            reached = grown
+        return (reached == white).all(axis=(1, 2))
+
+
+    # Check a batch of shadings, either a boolean array as above or a list of shaded sets of cells.
+    # Returns {rule: boolean array with an entry per shading}, with "valid" True where every rule holds
+    def validate(self, shadings):
+        if not isinstance(shadings, np.ndarray):
+            shadings = self.toArray(shadings)
+        results = {"adjacent": self.checkAdjacent(shadings),
+                   "regions": self.checkRegions(shadings),
+                   "runs": self.checkRuns(shadings),
+                   "connected": self.checkConnected(shadings)}
+        results["valid"] = np.logical_and.reduce(list(results.values()))
+        return results
@@ -0,0 +1,120 @@
+import json, os
+from puzzlefile import findPuzzles, isLibrary, loadPuzzle, openLibrary, puzzleName
+from Profiler import Profiler
+from Solver import Solver, BACKENDS
+
+
+# Every puzzle of the files as a task (path, index), index being None for a puzzle file. Generated lazily, one task
+# per puzzle of a library, so that results stream in as each puzzle finishes and every worker is kept busy.
+# A worker reads its puzzle straight from the memory-mapped library
+def makeTasks(paths):
+    for path in paths:
+        if isLibrary(path):
+            yield from ((path, index) for index in range(len(openLibrary(path))))
+        else:
+            yield path, None
+
+
+caches = {}         # SolutionCache opened by each worker process, by path
+
+# Solve a single puzzle, from a puzzle file or (with an index) a library, looking it up in the
+# solution cache at cachePath first if there is one. profile=True adds the solve's profile (Profiler.toDict) to the result.
+# validate=True checks the solutions independently with Validator.py, which needs numpy, and adds "valid" to the result.
+# Runs in a worker process, so errors are returned rather than raised
+def solvePuzzleFile(path, index, threads, backend, verifyUnique, cachePath=None, profile=False, validate=False):
+    name = puzzleName(path, index)
+    profiler = Profiler(profile)
+    try:
+        cache = None
+        if cachePath:
+            from SolutionCache import SolutionCache
+            if cachePath not in caches:
+                caches[cachePath] = SolutionCache(cachePath)
+            cache = caches[cachePath]
+        information = loadPuzzle(path, index)
+        solver = Solver(information)
+        solution = solver.solve(backend, verbose=False, threads=threads, verifyUnique=verifyUnique, cache=cache,
+                                             profiler=profiler)
+    except Exception as error:
+        return {"puzzle": name, "error": str(error)}
+    result = {"puzzle": name,
+              "solved": solution.solved,
+              "runtime": solution.runtime,
+              "cached": solution.cached,
+              "nodeCount": solution.nodeCount,
+              "lazyConstraintsAdded": solution.lazyConstraintsAdded,
+              "shaded": sorted(solution.shaded) if solution.solved else None,
+              "unique": solution.unique,
+              "secondShaded": sorted(solution.secondShaded) if solution.secondShaded else None}
+    if profile:
+        result["profile"] = profiler.toDict()
+    if validate and solution.solved:
+        from Validator import Validator
+        shadeds = [solution.shaded] + ([solution.secondShaded] if solution.secondShaded else [])
+        result["valid"] = bool(Validator(solver).validate(shadeds)["valid"].all())
+    return result
+
+
+# Solve puzzle files across a pool of worker processes, yielding each result as soon as it finishes.
+# Every solve is limited to threads Gurobi threads so the workers don't oversubscribe the cores.
+# backend=None uses Gurobi if it is installed and the native search otherwise.
+# verifyUnique=True also checks that every puzzle has exactly one solution.
+# cachePath is a SolutionCache file shared by the workers, so repeated (or rotated or mirrored) puzzles are solved once.
+# profile=True adds each solve's profile to its result, and validate=True an independent check of its solutions
+def solveBatch(paths, workers=None, threads=None, backend=None, verifyUnique=False, cachePath=None, profile=False, validate=False):
+    workers = workers or os.cpu_count() or 1
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    import multiprocessing      # Deferred so that the rest of the command line starts quickly
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(solveTask, ((task, threads, backend, verifyUnique, cachePath, profile, validate) for task in makeTasks(paths)))
+
+
+# Solve the puzzle of a task from makeTasks in a worker process
+def solveTask(arguments):
+    (path, index), threads, backend, verifyUnique, cachePath, profile, validate = arguments
+    return solvePuzzleFile(path, index, threads, backend, verifyUnique, cachePath, profile, validate)
+
+
+# One line summary of a result
+def formatResult(result):
+    if "error" in result:
+        return f"{result['puzzle']}: error: {result['error']}"
+    if not result["solved"]:
+        return f"{result['puzzle']}: no solution found in {result['runtime']:.2f} seconds"
+    uniqueness = {True: ", unique", False: ", NOT unique", None: ""}[result["unique"]]
+    uniqueness += {True: ", checked", False: ", INVALID", None: ""}[result.get("valid")]
+    if result["cached"]:
+        return f"{result['puzzle']}: found in the solution cache, {len(result['shaded'])} black cells{uniqueness}"
+    return (f"{result['puzzle']}: solved in {result['runtime']:.2f} seconds, "
+            f"{result['lazyConstraintsAdded']} walls/loops, {len(result['shaded'])} black cells{uniqueness}")
+
+
+def addArguments(parser):
+    parser.add_argument("puzzles", nargs="+", help="puzzle files, directories or glob patterns")
+    parser.add_argument("--legacy", action="store_true", help="also pick up legacy pickled puzzle files (*.txt) in directories")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes (default: one per core)")
+    parser.add_argument("-t", "--threads", type=int, help="Gurobi threads per solve (default: cores divided by workers)")
+    parser.add_argument("-b", "--backend", choices=BACKENDS, help="solver backend (default: gurobi if installed, otherwise native)")
+    parser.add_argument("-u", "--verify-unique", action="store_true", help="also check that each puzzle has exactly one solution")
+    parser.add_argument("-c", "--cache", metavar="FILE", help="reuse solutions from this cache file, and store new ones in it")
+    parser.add_argument("--json", action="store_true", help="print each result as a JSON line")
+    parser.add_argument("--validate", action="store_true", help="check every solution independently (needs numpy)")
+    parser.add_argument("-p", "--profile", metavar="FILE",
+                        help="profile the solves and write the combined profile to FILE, as JSON or as flamegraph folded stacks if FILE ends in .folded")
+
+
+def main(args):
+    paths = findPuzzles(args.puzzles, args.legacy)
+    if not paths:
+        print("No puzzle files found")
+        return
+    profiler = Profiler(bool(args.profile))
+    for result in solveBatch(paths, args.workers, args.threads, args.backend, args.verify_unique, args.cache, profiler.enabled,
+                             args.validate):
+        if "profile" in result:
+            profiler.merge(result.pop("profile"))
+        print(json.dumps(result) if args.json else formatResult(result), flush=True)
+    if profiler.enabled:
+        profiler.write(args.profile)
+        if not args.json:
+            print(profiler.summary())
@@ -0,0 +1,150 @@
+import argparse, glob, json, multiprocessing, os, resource, subprocess, sys, time
+from puzzlefile import listPuzzles, loadPuzzle, puzzleName
+from Solver import Solver, BACKENDS, availableBackends, defaultBackend
+
+
+# Metrics recorded for every puzzle, and the absolute change in each below which a difference is treated as noise
+METRICS = {"presolveTime": 0.05, "buildTime": 0.05, "runtime": 0.1, "callbackCount": 5, "callbackTime": 0.05,
+           "lazyConstraintsAdded": 5, "nodeCount": 10, "lpBound": 1, "peakMemory": 10240}
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+STARTUP_TARGET = 0.1    # Seconds the command line may take to start. Neither pygame nor gurobipy is imported on this path
+
+
+# Solve a single puzzle file, or puzzle number index of a library, and record its metrics. Runs in a fresh process so that the peak
+# resident memory (reported in kilobytes) belongs to this puzzle alone and includes Gurobi's own allocations
+def benchmarkPuzzle(path, adjacency="bigM", backend=None, index=None):
+    backend = backend or defaultBackend()
+    information = loadPuzzle(path, index)
+
+    solution = Solver(information).solve(backend, verbose=False, adjacency=adjacency, measureBound=True)
+
+    peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":     # macOS reports bytes rather than kilobytes
+        peakMemory //= 1024
+
+    return {"backend": backend,
+            "length": information["length"],
+            "solved": solution.solved,
+            "cellsDecided": solution.cellsDecided,
+            "presolveTime": solution.presolveTime,
+            "buildTime": solution.buildTime,
+            "runtime": solution.runtime,
+            "callbackCount": solution.callbackCount,
+            "callbackTime": solution.callbackTime,
+            "lazyConstraintsAdded": solution.lazyConstraintsAdded,
+            "userCutsAdded": solution.userCutsAdded,
+            "nodeCount": solution.nodeCount,
+            "lpBound": solution.lpBound,
+            "blackCells": len(solution.shaded) if solution.solved else None,
+            "peakMemory": peakMemory}
+
+
+# Time the command line from launch to exit as the best of several runs of main.py --help, each in a fresh interpreter
+def measureStartup(repeats=5):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), "--help"]
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# Benchmark every puzzle in turn, each in its own worker process. Libraries are benchmarked puzzle by puzzle,
+# keyed by "path#index". A puzzle that fails to load or solve is recorded with its error instead of metrics
+def runBenchmark(paths, adjacency="bigM", backend=None):
+    report = {}
+    for source in paths:
+        for path, index in listPuzzles(source):
+            with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+                try:
+                    report[puzzleName(path, index)] = pool.apply(benchmarkPuzzle, (path, adjacency, backend, index))
+                except Exception as error:
+                    report[puzzleName(path, index)] = {"error": str(error)}
+    return report
+
+
+# Compare a report against a baseline. A metric regresses when it exceeds the baseline by more than
+# the relative tolerance and by more than its noise threshold. Returns a list of regression descriptions
+def compareReports(report, baseline, tolerance):
+    regressions = []
+    for path, metrics in report.items():
+        if path not in baseline:
+            continue
+        previous = baseline[path]
+        if previous.get("backend", "gurobi") != metrics.get("backend", "gurobi"):    # Different backends aren't comparable
+            continue
+        if "error" in metrics:
+            if "error" not in previous:
+                regressions.append(f"{path}: {metrics['error']}")
+            continue
+        if previous.get("solved") and not metrics["solved"]:
+            regressions.append(f"{path}: no longer solved")
+        for metric, noise in METRICS.items():
+            old, new = previous.get(metric), metrics[metric]
+            if old is not None and new is not None and new > old*(1 + tolerance) and new - old > noise:
+                regressions.append(f"{path}: {metric} {old:.4g} -> {new:.4g}")
+    return regressions
+
+
+def printReport(report):
+    print(f"{'puzzle':<24}{'backend':>8}{'size':>6}{'decided':>9}{'presolve':>10}{'build':>9}{'runtime':>9}{'callbacks':>11}{'cb time':>9}{'cuts':>7}"
+          f"{'user cuts':>11}{'nodes':>7}{'LP bound':>10}{'black':>7}{'peak KB':>10}")
+    for path, metrics in report.items():
+        if "error" in metrics:
+            print(f"{path:<24}  ERROR {metrics['error']}")
+            continue
+        print(f"{path:<24}{metrics['backend']:>8}{metrics['length']:>6}{metrics['cellsDecided']:>9}{metrics['presolveTime']:>10.3f}{metrics['buildTime']:>9.3f}{metrics['runtime']:>9.3f}"
+              f"{metrics['callbackCount']:>11}{metrics['callbackTime']:>9.3f}{metrics['lazyConstraintsAdded']:>7}"
+              f"{metrics['userCutsAdded']:>11}{metrics['nodeCount']:>7}{metrics['lpBound'] or 0:>10.1f}{str(metrics['blackCells']):>7}{metrics['peakMemory']:>10}" + ("" if metrics["solved"] else "  NOT SOLVED"))
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the solver over a set of puzzle files")
+    parser.add_argument("puzzles", nargs="*", help="puzzle files or libraries (default: puzzle0.txt - puzzle9.txt)")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"baseline report to compare against (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--adjacency", choices=["bigM", "pairwise"], default="bigM", help="formulation of the no-adjacent-black-cells rule")
+    parser.add_argument("--backend", choices=BACKENDS + ["all"], help="solver backend, or all to compare every installed backend "
+                        "head to head (default: gurobi if installed, otherwise native)")
+    parser.add_argument("--startup", action="store_true", help=f"only measure the startup time of main.py against its target of {STARTUP_TARGET} seconds")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    if args.startup:
+        startup = measureStartup()
+        print(f"Startup took {startup:.3f} seconds (target {STARTUP_TARGET} seconds)")
+        sys.exit(1 if startup > STARTUP_TARGET else 0)
+
+    paths = args.puzzles or sorted(glob.glob("puzzle[0-9].txt"))
+    # With several backends every puzzle is reported once per backend, keyed by "path (backend)"
+    backends = availableBackends() if args.backend == "all" else [args.backend or defaultBackend()]
+    report = {}
+    for backend in backends:
+        for path, metrics in runBenchmark(paths, args.adjacency, backend).items():
+            report[path if len(backends) == 1 else f"{path} ({backend})"] = metrics
+    printReport(report)
+
+    if args.output:
+        with open(args.output, "w") as filehandle:
+            json.dump(report, filehandle, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as filehandle:
+            json.dump(report, filehandle, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    else:
+        try:
+            with open(args.baseline) as filehandle:
+                baseline = json.load(filehandle)
+        except FileNotFoundError:
+            print(f"No baseline found at {args.baseline}, run with --save-baseline to create one")
+            sys.exit(0)
+        regressions = compareReports(report, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
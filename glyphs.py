@@ -0,0 +1,19 @@
+import pygame
+
+
+# Fonts and rendered text shared by every widget. pygame.font.SysFont searches the system fonts each time it is
+# called, so each size is only looked up once, and the text a grid cell shows (a clue in one of a few colours)
+# is only rendered once
+fonts = {}      # Font by size
+glyphs = {}     # Rendered text by (text, size, colour)
+
+def font(size):
+    if size not in fonts:
+        fonts[size] = pygame.font.SysFont("arial", size, bold=1)
+    return fonts[size]
+
+def glyph(text, size, colour):
+    key = (text, size, colour)
+    if key not in glyphs:
+        glyphs[key] = font(size).render(text, False, colour)
+    return glyphs[key]
@@ -1,9 +1,22 @@
-from App import *
+import argparse
+import batch, puzzlefile
 
 
 if __name__ == "__main__":
-    app = App()
-    app.run()
+    parser = argparse.ArgumentParser(description="Heyawake solver. Run without arguments to open the interactive window")
+    subparsers = parser.add_subparsers(dest="command")
+    batch.addArguments(subparsers.add_parser("batch", help="solve a directory or glob of puzzle files"))
+    puzzlefile.addArguments(subparsers.add_parser("convert", help="convert puzzle files to the compact binary format"))
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        batch.main(args)
+    elif args.command == "convert":
+        puzzlefile.main(args)
+    else:
+        from App import App     # pygame is only loaded when the window is opened
+        app = App()
+        app.run()
     
 
 
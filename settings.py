@@ -1,5 +1,6 @@
 WIDTH = 1600 
 HEIGHT = 900
+FPS = 60        # Frame rate cap of the main loop
 
 # Colours
 WHITE = (255,255,255)
@@ -0,0 +1,51 @@
+import os, random, sys
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from puzzlefile import loadPuzzle
+from Solver import Solver
+
+
+# The loop mode of purgeTrails as it was before it peeled endpoints off a queue, kept as the reference:
+# remove every cell with a single diagonal neighbour left until there is none
+def oldPurgeTrails(solver, cells):
+    visitedCells = list(cells)
+    trailExists = True
+    while trailExists:
+        trailExists = False
+        for cell in visitedCells:
+            neighbours = solver.diagonalNeighbours(cell)
+            if len(set(visitedCells).intersection(neighbours)) == 1:
+                trailExists = True
+                visitedCells.remove(cell)
+    return visitedCells
+
+
+# Loop components of random shadings of a puzzle's grid, seeded so that every run checks the same ones
+def loopComponents(solver, seed):
+    generator = random.Random(seed)
+    components = []
+    for density in [0.3, 0.4, 0.5]:
+        for repeat in range(20):
+            black = [generator.random() < density for cell in solver.cells]
+            components.extend(cells for cells, closing in solver.findWallsAndLoops(black)[1])
+    return components
+
+
+@pytest.mark.parametrize("number", range(10))
+def test_matches_old_purge_trails(number):
+    solver = Solver(loadPuzzle(os.path.join(ROOT, f"puzzle{number}.txt")))
+    components = loopComponents(solver, number)
+    assert components
+    for cells in components:
+        assert solver.purgeTrails(cells) == oldPurgeTrails(solver, cells)
+
+
+# Two diamonds joined by a path: the path lies between two cycles, so it stays, while the tail off one diamond goes
+def test_keeps_path_between_loops():
+    solver = Solver({"length": 12, "regions": [{(i,j): None for i in range(12) for j in range(12)}]})
+    diamonds = [(2,3), (3,2), (4,3), (3,4), (2,9), (3,8), (4,9), (3,10)]
+    path = [(2,5), (3,6), (2,7)]
+    tail = [(5,4), (6,5)]
+    assert sorted(solver.purgeTrails(diamonds + path + tail)) == sorted(diamonds + path)